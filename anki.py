@@ -0,0 +1,221 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+===Description===
+Module for export to Anki without Lingualeo.
+Words are saved as Anki package (.apkg) - zip with
+collection.anki2 (SQLite) and empty media list.
+All notes and cards are inserted in one transaction.
+"""
+
+import os
+import time
+import json
+import base64
+import shutil
+import sqlite3
+import zipfile
+import hashlib
+import tempfile
+from html import escape
+
+SCHEMA = """
+CREATE TABLE col (
+    id INTEGER PRIMARY KEY, crt INTEGER NOT NULL, mod INTEGER NOT NULL,
+    scm INTEGER NOT NULL, ver INTEGER NOT NULL, dty INTEGER NOT NULL,
+    usn INTEGER NOT NULL, ls INTEGER NOT NULL, conf TEXT NOT NULL,
+    models TEXT NOT NULL, decks TEXT NOT NULL, dconf TEXT NOT NULL,
+    tags TEXT NOT NULL);
+CREATE TABLE notes (
+    id INTEGER PRIMARY KEY, guid TEXT NOT NULL, mid INTEGER NOT NULL,
+    mod INTEGER NOT NULL, usn INTEGER NOT NULL, tags TEXT NOT NULL,
+    flds TEXT NOT NULL, sfld INTEGER NOT NULL, csum INTEGER NOT NULL,
+    flags INTEGER NOT NULL, data TEXT NOT NULL);
+CREATE TABLE cards (
+    id INTEGER PRIMARY KEY, nid INTEGER NOT NULL, did INTEGER NOT NULL,
+    ord INTEGER NOT NULL, mod INTEGER NOT NULL, usn INTEGER NOT NULL,
+    type INTEGER NOT NULL, queue INTEGER NOT NULL, due INTEGER NOT NULL,
+    ivl INTEGER NOT NULL, factor INTEGER NOT NULL, reps INTEGER NOT NULL,
+    lapses INTEGER NOT NULL, left INTEGER NOT NULL, odue INTEGER NOT NULL,
+    odid INTEGER NOT NULL, flags INTEGER NOT NULL, data TEXT NOT NULL);
+CREATE TABLE revlog (
+    id INTEGER PRIMARY KEY, cid INTEGER NOT NULL, usn INTEGER NOT NULL,
+    ease INTEGER NOT NULL, ivl INTEGER NOT NULL, lastIvl INTEGER NOT NULL,
+    factor INTEGER NOT NULL, time INTEGER NOT NULL, type INTEGER NOT NULL);
+CREATE TABLE graves (
+    usn INTEGER NOT NULL, oid INTEGER NOT NULL, type INTEGER NOT NULL);
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+CREATE INDEX ix_notes_csum ON notes (csum);
+"""
+
+# default options of deck - the same as in new Anki collection
+DECK_CONF = {
+    "id": 1, "name": "Default", "mod": 0, "usn": 0, "dyn": False,
+    "maxTaken": 60, "timer": 0, "autoplay": True, "replayq": True,
+    "new": {"delays": [1, 10], "ints": [1, 4, 7], "initialFactor": 2500,
+            "order": 1, "perDay": 20, "bury": True, "separate": True},
+    "rev": {"perDay": 100, "ease4": 1.3, "fuzz": 0.05, "ivlFct": 1,
+            "maxIvl": 36500, "bury": True, "minSpace": 1},
+    "lapse": {"delays": [10], "mult": 0, "minInt": 1,
+              "leechFails": 8, "leechAction": 0}}
+
+CSS = """.card {
+ font-family: arial;
+ font-size: 20px;
+ text-align: center;
+}
+.context {
+ font-size: 14px;
+ font-style: italic;
+}"""
+
+
+def checksum(text):
+    """
+    Checksum of sort field - the same as Anki uses
+    for finding duplicates
+    """
+    return int(hashlib.sha1(text.encode('utf-8')).hexdigest()[:8], 16)
+
+
+class Deck(object):
+    """
+    Anki deck of words - one note (and one card) per word.
+    Word is front, translation and context are back.
+    """
+    NAME = "Kindleo"
+    FIELDS = ("Word", "Translation", "Context")
+    COLLECTION = "collection.anki2"
+    # Anki collection format
+    VERSION = 11
+    FRONT = "{{Word}}"
+    BACK = ("{{FrontSide}}<hr id=answer>{{Translation}}"
+            "<div class=context>{{Context}}</div>")
+
+    def __init__(self, path, name=None, translations=None,
+                 translated_only=False):
+        """
+        path - .apkg file.
+        translations - dictionary word - translation (e.g. from
+        History) for rows without translation.
+        translated_only - rows still without translation are
+        skipped (card would have empty back).
+        """
+        self.path = path
+        self.name = name or self.NAME
+        self.translations = translations or {}
+        self.translated_only = translated_only
+        # ids of deck and note type are stable for the same name,
+        # so notes of next export get into the same deck in Anki
+        digest = hashlib.sha1(self.name.encode('utf-8')).digest()
+        self.deck_id = int.from_bytes(digest[:4], 'big') + 1
+        self.model_id = int.from_bytes(digest[4:8], 'big') + 1
+
+    def guid(self, word):
+        """
+        Stable id of note - Anki updates note of the same word
+        instead of adding duplicate.
+        """
+        digest = hashlib.sha1((self.name + "\0" + word).encode('utf-8'))
+        return base64.b64encode(digest.digest()[:8]).decode('ascii')
+
+    def notes(self, rows):
+        """
+        Rows without duplicates (case-insensitive) as
+        list of (word, translation, context)
+        """
+        result = []
+        seen = set()
+        for row in rows:
+            word = row['word'].strip().lower()
+            if not word or word in seen:
+                continue
+            translate = row.get('tword') or self.translations.get(word, '')
+            if self.translated_only and not translate:
+                continue
+            seen.add(word)
+            result.append((word, translate, row.get('context') or ''))
+        return result
+
+    def collection(self, now, count):
+        """
+        Row of 'col' table - configuration, note type and deck
+        """
+        model = {
+            "id": self.model_id, "name": self.name, "type": 0,
+            "mod": now, "usn": -1, "sortf": 0, "did": self.deck_id,
+            "tmpls": [{"name": "Card 1", "ord": 0, "qfmt": self.FRONT,
+                       "afmt": self.BACK, "did": None,
+                       "bqfmt": "", "bafmt": ""}],
+            "flds": [{"name": name, "ord": i, "sticky": False,
+                      "rtl": False, "font": "Arial", "size": 20,
+                      "media": []} for i, name in enumerate(self.FIELDS)],
+            "css": CSS, "latexPre": "", "latexPost": "", "tags": [],
+            "vers": [], "req": [[0, "all", [0]]]}
+        deck = {"name": self.name, "id": self.deck_id, "mod": now,
+                "usn": -1, "lrnToday": [0, 0], "revToday": [0, 0],
+                "newToday": [0, 0], "timeToday": [0, 0],
+                "collapsed": False, "desc": "", "dyn": 0, "conf": 1,
+                "extendNew": 10, "extendRev": 50}
+        default = dict(deck, name="Default", id=1, desc="")
+        conf = {"nextPos": count + 1, "estTimes": True,
+                "activeDecks": [self.deck_id], "sortType": "noteFld",
+                "timeLim": 0, "sortBackwards": False, "addToCur": True,
+                "curDeck": self.deck_id, "newBury": True, "newSpread": 0,
+                "dueCounts": True, "curModel": str(self.model_id),
+                "collapseTime": 1200}
+        return (1, now, now * 1000, now * 1000, self.VERSION, 0, 0, 0,
+                json.dumps(conf),
+                json.dumps({str(self.model_id): model}),
+                json.dumps({"1": default, str(self.deck_id): deck}),
+                json.dumps({"1": DECK_CONF}),
+                json.dumps({}))
+
+    def write(self, rows):
+        """
+        Save rows {"word": word, "tword": translate, "context": context}
+        to package. Return count of notes.
+        """
+        notes = self.notes(rows)
+        now = int(time.time())
+        # ids of notes and cards are milliseconds - unique and ordered
+        first = now * 1000
+        folder = tempfile.mkdtemp()
+        try:
+            base = os.path.join(folder, self.COLLECTION)
+            conn = sqlite3.connect(base)
+            # temporary file - nothing to recover after crash
+            conn.execute("PRAGMA journal_mode = OFF")
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.executescript(SCHEMA)
+            with conn:
+                conn.execute("INSERT INTO col VALUES "
+                             "(?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                             self.collection(now, len(notes)))
+                conn.executemany(
+                    "INSERT INTO notes VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                    ((first + i, self.guid(word), self.model_id, now, -1,
+                      "", "\x1f".join(map(escape, (word, translate,
+                                                    context))),
+                      word, checksum(word), 0, "")
+                     for i, (word, translate, context) in enumerate(notes)))
+                # new cards - shown in order of export
+                conn.executemany(
+                    "INSERT INTO cards VALUES "
+                    "(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                    ((first + i, first + i, self.deck_id, 0, now, -1,
+                      0, 0, i + 1, 0, 0, 0, 0, 0, 0, 0, 0, "")
+                     for i in range(len(notes))))
+            conn.close()
+            with zipfile.ZipFile(self.path, 'w',
+                                 zipfile.ZIP_DEFLATED) as package:
+                package.write(base, self.COLLECTION)
+                package.writestr("media", "{}")
+        finally:
+            shutil.rmtree(folder)
+        return len(notes)
@@ -0,0 +1,308 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+===Description===
+Module for translation providers.
+Provider - object with get_translate(word) which returns
+the same as Lingualeo.get_translate:
+{"is_exist": is_exist, "word": word, "tword": translate}
+tword is empty if translation is unknown.
+Local StarDict dictionaries are asked first, Lingualeo -
+only for words they don't have.
+"""
+
+import os
+import re
+import mmap
+import zlib
+import struct
+from array import array
+
+# folder with StarDict dictionaries (.ifo, .idx, .dict/.dict.dz)
+DICT_DIR = os.path.join("src", "dicts")
+TAG = re.compile(r"<[^>]+>")
+# 1. 2) a) - numbers of meanings
+NUMBER = re.compile(r"^\s*(\d+[.)]|\w\))\s*")
+
+
+class Provider(object):
+    """
+    Interface of translation provider
+    """
+    # translation doesn't need Lingualeo, but Lingualeo
+    # doesn't tell if word is in user's dictionary
+    LOCAL = True
+
+    def get_translate(self, word):
+        """
+        Translation of word
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class DictZip(object):
+    """
+    Random access to dictzip file (.dict.dz).
+    Gzip with chunks compressed independently - only chunks
+    of requested range are decompressed.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        header = self.file.read(10)
+        if header[:2] != b'\x1f\x8b':
+            raise ValueError("Not gzip file - {}".format(path))
+        flags = header[3]
+        if not flags & 4:
+            raise ValueError("Not dictzip file - {}".format(path))
+        extra_length, = struct.unpack('<H', self.file.read(2))
+        extra = self.file.read(extra_length)
+        self.chunk_length, sizes = self.parseExtra(extra)
+        if not self.chunk_length:
+            raise ValueError("Not dictzip file - {}".format(path))
+        # name, comment - zero-terminated, crc of header
+        for flag in (8, 16):
+            if flags & flag:
+                while self.file.read(1) not in (b'\0', b''):
+                    pass
+        if flags & 2:
+            self.file.read(2)
+        self.offsets = [self.file.tell()]
+        for size in sizes:
+            self.offsets.append(self.offsets[-1] + size)
+
+    @staticmethod
+    def parseExtra(extra):
+        """
+        Length of chunk and compressed sizes of chunks
+        from subfield 'RA'
+        """
+        position = 0
+        while position + 4 <= len(extra):
+            name = extra[position:position + 2]
+            length, = struct.unpack('<H', extra[position + 2:position + 4])
+            data = extra[position + 4:position + 4 + length]
+            if name == b'RA':
+                _, chunk_length, count = struct.unpack('<HHH', data[:6])
+                sizes = struct.unpack('<{}H'.format(count),
+                                      data[6:6 + 2 * count])
+                return chunk_length, sizes
+            position += 4 + length
+        return 0, ()
+
+    def read(self, offset, size):
+        """
+        'size' bytes of uncompressed data from 'offset'
+        """
+        first = offset // self.chunk_length
+        last = (offset + size - 1) // self.chunk_length
+        data = []
+        for i in range(first, min(last + 1, len(self.offsets) - 1)):
+            self.file.seek(self.offsets[i])
+            chunk = self.file.read(self.offsets[i + 1] - self.offsets[i])
+            data.append(zlib.decompressobj(-zlib.MAX_WBITS).decompress(chunk))
+        start = offset - first * self.chunk_length
+        return b''.join(data)[start:start + size]
+
+    def close(self):
+        self.file.close()
+
+
+class PlainDict(object):
+    """
+    Random access to not compressed .dict file
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+
+    def read(self, offset, size):
+        self.file.seek(offset)
+        return self.file.read(size)
+
+    def close(self):
+        self.file.close()
+
+
+class StarDict(Provider):
+    """
+    StarDict dictionary.
+    Index (.idx) is memory-mapped, only offsets of its entries
+    are kept in memory. Definitions are read from .dict
+    (.dict.dz) by request.
+    """
+
+    def __init__(self, path):
+        """
+        path - .ifo file
+        """
+        base = os.path.splitext(path)[0]
+        self.info = self.readInfo(path)
+        self.name = self.info.get('bookname', os.path.basename(base))
+        # 64 - offsets of definitions are 8 bytes
+        self.offset_format = ">Q" if \
+            self.info.get('idxoffsetbits') == '64' else ">L"
+        self.entry_size = struct.calcsize(self.offset_format) + 4
+        self.types = self.info.get('sametypesequence', '')
+        with open(base + ".idx", 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.entries = self.indexEntries()
+        if os.path.exists(base + ".dict.dz"):
+            self.dict = DictZip(base + ".dict.dz")
+        else:
+            self.dict = PlainDict(base + ".dict")
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def readInfo(path):
+        """
+        Options of .ifo file - key=value lines
+        """
+        info = {}
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                key, sign, value = line.strip().partition('=')
+                if sign:
+                    info[key] = value
+        return info
+
+    def indexEntries(self):
+        """
+        Offsets of all entries of .idx:
+        word, zero byte, offset and size of definition.
+        """
+        entries = array('Q')
+        m = self.map
+        position = 0
+        while position < len(m):
+            entries.append(position)
+            position = m.find(b'\0', position) + 1 + self.entry_size
+            if position == self.entry_size:
+                break
+        return entries
+
+    def key(self, index):
+        """
+        Word of index-th entry (bytes)
+        """
+        start = self.entries[index]
+        return self.map[start:self.map.find(b'\0', start)]
+
+    def find(self, word):
+        """
+        Index of entry of word or None.
+        Entries are sorted by ASCII lowercase word, then by word,
+        so bisection is done by lowercase word and exact case
+        is looked for among entries with the same lowercase word.
+        """
+        key = word.encode('utf-8')
+        lower = key.lower()
+        low, high = 0, len(self.entries)
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle).lower() < lower:
+                low = middle + 1
+            else:
+                high = middle
+        found = None
+        index = low
+        while index < len(self.entries):
+            current = self.key(index)
+            if current.lower() != lower:
+                break
+            if current == key:
+                return index
+            if found is None:
+                found = index
+            index += 1
+        return found
+
+    def definition(self, index):
+        """
+        Text of definition of index-th entry
+        """
+        start = self.entries[index]
+        start = self.map.find(b'\0', start) + 1
+        offset, = struct.unpack(self.offset_format,
+                                self.map[start:start + self.entry_size - 4])
+        size, = struct.unpack(">L", self.map[start + self.entry_size - 4:
+                                             start + self.entry_size])
+        data = self.dict.read(offset, size)
+        # without sametypesequence every field starts with its type
+        if not self.types:
+            data = data[1:]
+        return data.split(b'\0')[0].decode('utf-8', 'replace')
+
+    @staticmethod
+    def shorten(text, word):
+        """
+        The first meaning of definition:
+        without tags, transcription and numbers
+        """
+        for line in TAG.sub("\n", text).splitlines():
+            line = NUMBER.sub("", line.strip())
+            if not line or line.startswith('[') or \
+                    line.lower() == word.lower():
+                continue
+            return re.split(r"[;,]", line)[0].strip()
+        return ""
+
+    def get_translate(self, word):
+        index = self.find(word)
+        tword = ""
+        if index is not None:
+            tword = self.shorten(self.definition(index), word)
+        return {"is_exist": False,
+                "word": word,
+                "tword": tword}
+
+    def close(self):
+        self.map.close()
+        self.dict.close()
+
+
+class Translator(Provider):
+    """
+    Asks providers in order, the first translation wins.
+    Response has 'local' - translation is from local provider.
+    """
+    LOCAL = False
+
+    def __init__(self, providers):
+        self.providers = list(providers)
+
+    def get_translate(self, word):
+        response = {"is_exist": False, "word": word, "tword": ""}
+        for provider in self.providers:
+            response = provider.get_translate(word)
+            response['local'] = getattr(provider, 'LOCAL', False)
+            if response['tword']:
+                break
+        return response
+
+    def close(self):
+        for provider in self.providers:
+            if isinstance(provider, Provider):
+                provider.close()
+
+
+def loadDictionaries(folder=DICT_DIR):
+    """
+    StarDict dictionaries of folder, broken ones are skipped
+    """
+    if not os.path.isdir(folder):
+        return []
+    result = []
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith(".ifo"):
+            continue
+        try:
+            result.append(StarDict(os.path.join(folder, name)))
+        except (OSError, ValueError):
+            continue
+    return result
@@ -0,0 +1,115 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+===Description===
+Module for export to several destinations at once.
+Words are read and translated once, every row of export
+is passed to all sinks (file, Anki deck, ...).
+Sink - object with write(row) and close().
+"""
+
+import queue
+import threading
+
+# end of rows
+DONE = None
+
+
+class Collector(object):
+    """
+    Sink which keeps rows and passes them to function on close.
+    For destinations which are written at once (e.g. anki.Deck.write).
+    """
+
+    def __init__(self, function, results=None):
+        """
+        results - only rows with these results are kept,
+        all rows if None
+        """
+        self.function = function
+        self.results = results
+        self.rows = []
+
+    def write(self, row):
+        if self.results is None or row['result'] in self.results:
+            self.rows.append(row)
+
+    def close(self):
+        self.function(self.rows)
+
+
+class FanOut(object):
+    """
+    Passes rows to sinks.
+    Every sink has own bounded queue and thread, so slow sink
+    makes producer wait only when its queue is full,
+    the other sinks go on with their queues.
+    """
+    QUEUE_SIZE = 100
+
+    def __init__(self, sinks, size=None):
+        """
+        Start thread for every sink
+        """
+        self.sinks = list(sinks)
+        self.errors = {}
+        self.closed = False
+        self.queues = [queue.Queue(maxsize=size or self.QUEUE_SIZE)
+                       for _ in self.sinks]
+        self.threads = []
+        for sink, items in zip(self.sinks, self.queues):
+            thread = threading.Thread(target=self.drain, args=(sink, items))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def __len__(self):
+        return len(self.sinks)
+
+    def drain(self, sink, items):
+        """
+        Write rows of queue to sink until DONE.
+        Failed sink is not used anymore, but its queue is
+        emptied - producer and other sinks don't wait for it.
+        """
+        failed = False
+        while True:
+            row = items.get()
+            if row is DONE:
+                break
+            if failed:
+                continue
+            try:
+                sink.write(row)
+            # sink can be anything - file, database, ...
+            except Exception as e:
+                self.errors[sink] = e
+                failed = True
+        try:
+            sink.close()
+        except Exception as e:
+            self.errors.setdefault(sink, e)
+
+    def put(self, row):
+        """
+        Pass row to every sink, wait if queue of sink is full
+        """
+        for items in self.queues:
+            items.put(row)
+
+    def putMany(self, rows):
+        for row in rows:
+            self.put(row)
+
+    def close(self):
+        """
+        Wait until sinks write all rows, close sinks.
+        Return dictionary sink - error of failed sinks.
+        """
+        if not self.closed:
+            self.closed = True
+            for items in self.queues:
+                items.put(DONE)
+            for thread in self.threads:
+                thread.join()
+        return self.errors
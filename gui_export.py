@@ -16,18 +16,32 @@ import sys
 import os
 import sqlite3
 import time
+import queue
+import threading
 import traceback
 import json
+import multiprocessing
 import psutil
 from PyQt4 import QtCore, QtGui
 from requests.exceptions import ConnectionError as NoConnection, Timeout
-from collections import Counter
-from operator import itemgetter
 from subprocess import check_call
 from tendo import singleton
 
-from handler import Kindle, Text
+from handler import Kindle, Text, Prose, Book, Clippings, compression,\
+                    readOnlyUri
+import service
 from service import Lingualeo
+from history import History
+from outbox import Outbox, flush
+from words import Lemmatizer, Frequency, removeDuplicates
+from schedule import prioritize
+from validate import WORD_PATTERN, validate
+from writer import FORMATS, Writer, dump
+from anki import Deck
+from fanout import FanOut, Collector
+from dictionary import Translator, loadDictionaries
+from stats import Statistics
+import secure
 from log_conf import setLogger
 
 # @FROZEN
@@ -262,7 +276,7 @@ class KindleTruncateSure(CustomDialog):
     Prompt dialog when Kindle's database is going to be truncated
     """
     ICON_FILE = os.path.join("src", "pics", "truncate.ico")
-    truncate = QtCore.pyqtSignal()
+    truncate = QtCore.pyqtSignal(bool)
 
     def __init__(self):
         """
@@ -291,12 +305,15 @@ class KindleTruncateSure(CustomDialog):
         hor_lay = QtGui.QHBoxLayout()
         self.sure_label = QtGui.QLabel()
         self.sure_label.setAlignment(QtCore.Qt.AlignCenter)
+        self.exported_check = QtGui.QCheckBox()
+        self.exported_check.setChecked(True)
         self.yes_button = QtGui.QPushButton()
         self.no_button = QtGui.QPushButton()
         self.no_button.setFocus()
         hor_lay.addWidget(self.no_button)
         hor_lay.addWidget(self.yes_button)
         layout.addWidget(self.sure_label)
+        layout.addWidget(self.exported_check)
         layout.addLayout(hor_lay)
         self.setLayout(layout)
 
@@ -307,6 +324,8 @@ class KindleTruncateSure(CustomDialog):
         self.setWindowTitle(self.title)
         self.setWindowIcon(QtGui.QIcon(self.ICON_FILE))
         self.sure_label.setText(self.tr("Are you sure to truncate database?"))
+        self.exported_check.setText(self.tr(
+            "Only words exported in this session"))
         self.yes_button.setText(self.tr("Yes"))
         self.no_button.setText(self.tr("No"))
 
@@ -320,9 +339,9 @@ class KindleTruncateSure(CustomDialog):
 
     def truncateEvent(self):
         """
-
+        Emit truncate - only exported words or everything
         """
-        self.truncate.emit()
+        self.truncate.emit(self.exported_check.isChecked())
 
 
 class NotificationDialog(CustomDialog):
@@ -380,6 +399,15 @@ class MainWindow(QtGui.QMainWindow):
     """
     ICON_FILE = os.path.join("src", "pics", "lingualeo.ico")
     SRC_FILE = os.path.join("src", "src.ini")
+    # what to do with common words - index in common_mode_combo
+    COMMON_SKIP = 0
+    COMMON_LAST = 1
+    # local snapshots of Kindle databases
+    CACHE_DIR = os.path.join("src", "cache")
+    # logs of export sessions
+    SESSION_DIR = os.path.join("src", "sessions")
+    # login starts when email/password are not changed for this time (ms)
+    AUTH_DELAY = 500
     VOCAB_PATH = os.path.join("Kindle",
                               "system",
                               "vocabulary",
@@ -403,7 +431,8 @@ class MainWindow(QtGui.QMainWindow):
         -default language - English.
         -set logging of module.
         -centered on screen.
-        -load default email/pass/lang if present.
+        -load default email/pass/lang if present,
+         start login in background.
         -ensure only 1/3 blocks enabled.
         -init actions
         -set validator for manual input's field
@@ -414,12 +443,34 @@ class MainWindow(QtGui.QMainWindow):
         self.file_name = None
         self.array = None
         self.lingualeo = None
+        # clippings handler - its offset is saved after export
+        self.clippings = None
+        # clippings handler of the last read source
+        self.read_clippings = None
+        self.lemmatizer = Lemmatizer()
+        self.frequency = Frequency()
         self.dialog = ExportDialog()
-        self.dialog.closed.connect(self.clearMessage)
+        self.dialog.closed.connect(self.exportFinished)
+        self.dialog.queued.connect(self.startOutbox)
         self.close_window = QuitSure()
         self.close_window.checked.connect(self.saveDefaults)
         self.truncate_sure_window = KindleTruncateSure()
         self.truncate_sure_window.truncate.connect(self.kindleTruncate)
+        self.kindle_task = KindleWriteThread()
+        self.kindle_task.progressed.connect(self.kindleWriteProgress)
+        self.kindle_task.finished.connect(self.kindleWriteFinished)
+        self.outbox_task = OutboxThread()
+        self.outbox_task.flushed.connect(self.outboxFlushed)
+        self.outbox_task.finished.connect(self.outboxFinished)
+        self.outbox_window = StatisticsDialog()
+        self.outbox_stat = []
+        self.auth_task = AuthThread()
+        self.auth_timer = QtCore.QTimer()
+        self.auth_timer.setSingleShot(True)
+        # export is waiting for login
+        self.export_waiting = False
+        # login was just finished for waiting export
+        self.auth_fresh = False
         self.notif = NotificationDialog()
         self.about = AboutDialog()
         self.initUI()
@@ -430,12 +481,15 @@ class MainWindow(QtGui.QMainWindow):
         self.initActions()
         self.setValidators()
         self.logger = setLogger(name='MainWindow')
+        # words queued in previous sessions
+        self.startOutbox()
         self.logger.debug("Inited MainWindow")
 
     def createMenuBar(self):
         """
         Create menubar for MainWindow.
-        Has Language submenu - EN/RU/UA and Exit.
+        Has Language submenu - EN/RU/UA, Save word list,
+        Export to Anki and Exit.
         """
         self.menu_bar = QtGui.QMenuBar()
         self.main_menu = QtGui.QMenu()
@@ -447,7 +501,11 @@ class MainWindow(QtGui.QMainWindow):
             self.lang_action_group.addAction(action)
             self.language_menu.addAction(action)
         self.exit_action = QtGui.QAction(self)
+        self.save_words_action = QtGui.QAction(self)
+        self.anki_action = QtGui.QAction(self)
         self.main_menu.addAction(self.language_menu.menuAction())
+        self.main_menu.addAction(self.save_words_action)
+        self.main_menu.addAction(self.anki_action)
         self.main_menu.addAction(self.exit_action)
 
         self.help_menu = QtGui.QMenu(self.menu_bar)
@@ -511,9 +569,15 @@ class MainWindow(QtGui.QMainWindow):
         self.text_button.setObjectName("set_text")
         self.text_path = QtGui.QLineEdit()
         self.text_path.setReadOnly(True)
-        text_layout = QtGui.QHBoxLayout()
-        text_layout.addWidget(self.text_button)
-        text_layout.addWidget(self.text_path)
+        # folder with books
+        self.text_library_button = QtGui.QPushButton()
+        self.text_library_button.setObjectName("set_library")
+        self.text_prose_check = QtGui.QCheckBox()
+        text_layout = QtGui.QGridLayout()
+        text_layout.addWidget(self.text_button, 0, 0, 1, 1)
+        text_layout.addWidget(self.text_path, 0, 1, 1, 1)
+        text_layout.addWidget(self.text_library_button, 0, 2, 1, 1)
+        text_layout.addWidget(self.text_prose_check, 1, 0, 1, 3)
 
         return text_layout
 
@@ -535,6 +599,7 @@ class MainWindow(QtGui.QMainWindow):
         self.words_radio_group = QtGui.QButtonGroup()
         self.words_radio_group.addButton(self.kindle_all_words_radio)
         self.words_radio_group.addButton(self.kindle_new_words_radio)
+        self.kindle_mastered_check = QtGui.QCheckBox()
         self.kindle_truncate_button = QtGui.QPushButton()
         self.kindle_repair_button = QtGui.QPushButton()
         self.kindle_repair_button.hide()
@@ -543,11 +608,34 @@ class MainWindow(QtGui.QMainWindow):
         kindle_layout.addWidget(self.kindle_path, 0, 1, 1, 1)
         kindle_layout.addWidget(self.kindle_all_words_radio, 1, 0, 1, 2)
         kindle_layout.addWidget(self.kindle_new_words_radio, 2, 0, 1, 2)
-        kindle_layout.addWidget(self.kindle_truncate_button, 3, 0, 1, 2)
-        kindle_layout.addWidget(self.kindle_repair_button, 4, 0, 1, 2)
+        kindle_layout.addWidget(self.kindle_mastered_check, 3, 0, 1, 2)
+        kindle_layout.addWidget(self.kindle_truncate_button, 4, 0, 1, 2)
+        kindle_layout.addWidget(self.kindle_repair_button, 5, 0, 1, 2)
 
         return kindle_layout
 
+    def createFilterBlock(self):
+        """
+        Construct block for filter of common words and
+        destinations of export besides Lingualeo
+        """
+        self.common_check = QtGui.QCheckBox()
+        self.common_rank_spin = QtGui.QSpinBox()
+        self.common_rank_spin.setRange(100, 2000)
+        self.common_rank_spin.setSingleStep(100)
+        self.common_rank_spin.setValue(1000)
+        self.common_mode_combo = QtGui.QComboBox()
+        self.log_check = QtGui.QCheckBox()
+        self.anki_check = QtGui.QCheckBox()
+        filter_layout = QtGui.QGridLayout()
+        filter_layout.addWidget(self.common_check, 0, 0, 1, 1)
+        filter_layout.addWidget(self.common_rank_spin, 0, 1, 1, 1)
+        filter_layout.addWidget(self.common_mode_combo, 0, 2, 1, 1)
+        filter_layout.addWidget(self.log_check, 1, 0, 1, 1)
+        filter_layout.addWidget(self.anki_check, 1, 1, 1, 2)
+
+        return filter_layout
+
     def initUI(self):
         """
         Construct GUI gor MainWindow
@@ -562,6 +650,7 @@ class MainWindow(QtGui.QMainWindow):
         self.input_layout = self.createInputBlock()
         self.text_layout = self.createTextBlock()
         self.kindle_layout = self.createKindleBlock()
+        self.filter_layout = self.createFilterBlock()
 
         self.export_button = QtGui.QPushButton()
         self.bottom_layout = QtGui.QHBoxLayout()
@@ -572,9 +661,9 @@ class MainWindow(QtGui.QMainWindow):
         self.source_group.addButton(self.text_radio)
         self.source_group.addButton(self.kindle_radio)
 
-        # Create 4 separators for next usage
+        # Create 5 separators for next usage
         h_lines = []
-        for _ in range(4):
+        for _ in range(5):
             h = createSeparator()
             h_lines.append(h)
 
@@ -591,6 +680,8 @@ class MainWindow(QtGui.QMainWindow):
         self.main_layout.addWidget(self.kindle_hint)
         self.main_layout.addLayout(self.kindle_layout)
         self.main_layout.addWidget(h_lines[3])
+        self.main_layout.addLayout(self.filter_layout)
+        self.main_layout.addWidget(h_lines[4])
         self.main_layout.addLayout(self.bottom_layout)
         self.status_bar = QtGui.QStatusBar()
         self.setStatusBar(self.status_bar)
@@ -619,6 +710,12 @@ class MainWindow(QtGui.QMainWindow):
         self.text_radio.setText(self.tr("Text"))
         self.text_radio.setStyleSheet("text-decoration:underline")
         self.text_button.setText(self.tr("Path"))
+        self.text_library_button.setText(self.tr("Folder"))
+        self.text_library_button.setToolTip(self.tr(
+            "Folder with books (EPUB, HTML)"))
+        self.text_prose_check.setText(self.tr("Whole text (book, article)"))
+        self.text_prose_check.setToolTip(self.tr(
+            "Not one word per line - take every word of text"))
 
         self.kindle_radio.setText(self.tr("Kindle"))
         self.kindle_radio.setStyleSheet("text-decoration:underline")
@@ -631,6 +728,10 @@ class MainWindow(QtGui.QMainWindow):
             "Only new"))
         self.kindle_new_words_radio.setToolTip(self.tr(
             "Words, marked for learning"))
+        self.kindle_mastered_check.setText(self.tr(
+            "Mark exported words as mastered"))
+        self.kindle_mastered_check.setToolTip(self.tr(
+            "They won't be in 'Only new' next time"))
         self.kindle_button.setText(self.tr(
             "Path"))
         self.export_button.setText(self.tr(
@@ -639,6 +740,23 @@ class MainWindow(QtGui.QMainWindow):
             "Truncate"))
         self.kindle_repair_button.setText(self.tr(
             "Repair"))
+        self.common_check.setText(self.tr(
+            "Common words, top"))
+        self.common_check.setToolTip(self.tr(
+            "The most frequent English words - you likely know them"))
+        mode = self.common_mode_combo.currentIndex()
+        self.common_mode_combo.clear()
+        self.common_mode_combo.addItems([self.tr("skip"),
+                                         self.tr("put last")])
+        self.common_mode_combo.setCurrentIndex(max(mode, 0))
+        self.log_check.setText(self.tr(
+            "Save session log"))
+        self.log_check.setToolTip(self.tr(
+            "Results of every export are saved to src/sessions"))
+        self.anki_check.setText(self.tr(
+            "Save Anki deck"))
+        self.anki_check.setToolTip(self.tr(
+            "Words of every export are saved to src/sessions"))
 
         # retranslate menu
         self.main_menu.setTitle(self.tr(
@@ -647,6 +765,10 @@ class MainWindow(QtGui.QMainWindow):
             "Language"))
         self.exit_action.setText(self.tr(
             "Exit"))
+        self.save_words_action.setText(self.tr(
+            "Save word list..."))
+        self.anki_action.setText(self.tr(
+            "Export to Anki..."))
 
         self.help_menu.setTitle(self.tr(
             "Help"))
@@ -662,7 +784,7 @@ class MainWindow(QtGui.QMainWindow):
         -no non-English letters
         -no !@#$%^&*()
         """
-        regexp = QtCore.QRegExp("^[a-zA-Z`'-]+(\s+[a-zA-Z`'-]+)*$")
+        regexp = QtCore.QRegExp("^{}$".format(WORD_PATTERN))
         validator = QtGui.QRegExpValidator(regexp)
         self.input_word_edit.setValidator(validator)
 
@@ -682,26 +804,113 @@ class MainWindow(QtGui.QMainWindow):
         self.input_context_label.setEnabled(input_state)
         self.text_button.setEnabled(text)
         self.text_path.setEnabled(text)
+        self.text_prose_check.setEnabled(text)
+        self.text_library_button.setEnabled(text)
         self.kindle_hint.setEnabled(kindle)
         self.kindle_all_words_radio.setEnabled(kindle)
         self.kindle_new_words_radio.setEnabled(kindle)
+        self.kindle_mastered_check.setEnabled(kindle)
         self.kindle_button.setEnabled(kindle)
         self.kindle_path.setEnabled(kindle)
         self.kindle_truncate_button.setEnabled(kindle)
 
+    def credentials(self):
+        """
+        Email and password from fields
+        """
+        return (self.email_edit.text().strip(" "),
+                self.pass_edit.text().strip(" "))
+
+    def credentialsChanged(self):
+        """
+        Email or password are changed - login again
+        when user stops typing
+        """
+        self.auth_timer.start(self.AUTH_DELAY)
+
+    def startAuth(self):
+        """
+        Start login to Lingualeo in background.
+        Nothing is done if login for these email/password
+        is running or succeeded.
+        """
+        email, password = self.credentials()
+        if not email or not password:
+            return
+        if self.auth_task.isRunning():
+            # will be started again in authFinished if needed
+            return
+        if self.auth_task.isFor(email, password) and \
+                self.auth_task.error is None:
+            return
+        self.auth_task.setVariables(email, password)
+        self.auth_task.start()
+
+    def authFinished(self):
+        """
+        Login is finished:
+        -credentials were changed meanwhile - login again.
+        -new session - save it.
+        -export is waiting - continue it.
+        """
+        email, password = self.credentials()
+        if not self.auth_task.isFor(email, password):
+            self.startAuth()
+            return
+        if self.auth_task.error is None:
+            self.logger.debug("Login in background is OK (session %s)",
+                              "reused" if self.auth_task.restored else "new")
+            if not self.auth_task.restored:
+                self.saveSession(self.auth_task.lingualeo)
+        if self.export_waiting:
+            self.export_waiting = False
+            self.auth_fresh = True
+            self.exportWords()
+
+    def authReady(self):
+        """
+        Check if login is just finished for current email/password.
+        Otherwise start (or wait for) login - export continues
+        when it is finished.
+        Session of previous login is checked again on every
+        export (cookies expire, meatballs are refilled),
+        failed login is tried again.
+        """
+        email, password = self.credentials()
+        fresh, self.auth_fresh = self.auth_fresh, False
+        if not email or not password:
+            return True
+        task = self.auth_task
+        if not task.isRunning() and task.isFor(email, password) and fresh:
+            return True
+        self.export_waiting = True
+        self.status_bar.showMessage(self.tr("Logging in..."))
+        if not task.isRunning():
+            previous = None
+            if task.isFor(email, password) and task.error is None:
+                previous = task.lingualeo
+            task.setVariables(email, password, previous)
+            task.start()
+        return False
+
     def lingualeoOk(self):
         """
-        Check for Lingualeo - email/pass, connection
+        Check for Lingualeo - email/pass, connection.
+        Login itself is done in background (see authReady)
         """
         self.logger.debug("Checking lingualeo")
-        email = self.email_edit.text().strip(" ")
-        password = self.pass_edit.text().strip(" ")
-        self.lingualeo = Lingualeo(email, password)
-
-        try:
-            self.lingualeo.auth()
+        email, password = self.credentials()
+        if not email or not password or \
+                not self.auth_task.isFor(email, password):
+            self.status_bar.showMessage(
+                self.tr("Email or password are incorrect"))
+            self.logger.debug(
+                "Lingualeo: WRONG email/pass incorrect")
+            return False
+        self.lingualeo = self.auth_task.lingualeo
+        error = self.auth_task.error
         # handle no internet connection/no site connection
-        except(NoConnection, Timeout):
+        if isinstance(error, (NoConnection, Timeout)):
             self.status_bar.showMessage(
                 self.tr("No connection"))
             self.logger.debug(
@@ -710,13 +919,12 @@ class MainWindow(QtGui.QMainWindow):
             return False
 
         # handle wrong email/password
-        except KeyError:
+        elif isinstance(error, KeyError):
             self.status_bar.showMessage(
                 self.tr("Email or password are incorrect"))
             self.logger.debug(
                 "Lingualeo: WRONG email/pass incorrect")
             return False
-        self.lingualeo.initUser()
         if self.lingualeo.meatballs == Lingualeo.NO_MEATBALLS:
             self.status_bar.showMessage(
                 self.tr("No meatballs"))
@@ -726,6 +934,13 @@ class MainWindow(QtGui.QMainWindow):
         self.logger.debug("Lingualeo is OK")
         return True
 
+    def saveSession(self, lingualeo):
+        """
+        Save session of Lingualeo (cookies) to keyring of system
+        """
+        if not secure.save(lingualeo.user(), lingualeo.exportSession()):
+            self.logger.debug("Session is not saved - no keyring")
+
     def inputOk(self):
         """
         Check for input presence
@@ -741,8 +956,8 @@ class MainWindow(QtGui.QMainWindow):
         """
         Check for correct txt file:
         - presence
-        - extension
-        - non-emptiness
+        - extension (or compressed - .gz, .bz2, .xz, or book)
+        - non-emptiness (folder - with books)
         """
         path = self.text_path.text()
         self.logger.debug("Checking TXT - %s", path)
@@ -752,7 +967,15 @@ class MainWindow(QtGui.QMainWindow):
                 self.tr("No txt file"))
             self.logger.debug("%s - no path", path)
             return False
-        if ext != '.txt':
+        if os.path.isdir(path):
+            if not any(Book(path).books()):
+                self.status_bar.showMessage(self.tr("No books in folder"))
+                self.logger.debug("%s - no books", path)
+                return False
+            self.logger.debug("%s - folder is OK", path)
+            return True
+        if ext != '.txt' and not Book.isBook(path) and \
+                not (os.path.isfile(path) and compression(path)):
             self.status_bar.showMessage(
                 self.tr("Not txt file"))
             self.logger.debug("%s - is not TXT", path)
@@ -764,21 +987,45 @@ class MainWindow(QtGui.QMainWindow):
         self.logger.debug("%s - TXT is OK", path)
         return True
 
+    def kindlePaths(self):
+        """
+        List of selected Kindle databases.
+        Several databases (one per device) are separated by os.pathsep
+        """
+        return [i for i in self.kindle_path.text().split(os.pathsep) if i]
+
     def kindleOk(self):
+        """
+        Check for correct Kindle databases.
+        At least one should be selected and every one should pass
+        the check
+        """
+        paths = self.kindlePaths()
+        # no path
+        if not paths:
+            self.status_bar.showMessage(self.tr("No Kindle database"))
+            self.logger.debug("Kindle - no path")
+            return False
+        return all(self.kindleDatabaseOk(path) for path in paths)
+
+    def showMalformed(self, path):
+        """
+        Database is malformed - offer to repair it
+        """
+        self.status_bar.showMessage(
+            self.tr("Database is malformed. Click 'Repair'"))
+        self.logger.debug("%s is malformed", path)
+        self.file_name = path
+        self.kindle_repair_button.show()
+
+    def kindleDatabaseOk(self, path):
         """
         Check for correct Kindle database:
-        - presence
         - extension (.db)
         - table WORDS exists
         - is not malformed
         """
-        path = self.kindle_path.text()
         self.logger.debug("Checking Kindle - %s", path)
-        # no path
-        if not path:
-            self.status_bar.showMessage(self.tr("No Kindle database"))
-            self.logger.debug("%s - no path", path)
-            return False
 
         # not valid database
         _, ext = os.path.splitext(path)
@@ -788,12 +1035,13 @@ class MainWindow(QtGui.QMainWindow):
             self.logger.debug("%s - not '.db'", path)
             return False
 
-        # check database
-        conn = sqlite3.connect(path)
+        # check database, device is opened read-only
+        conn = sqlite3.connect(readOnlyUri(path), uri=True)
         cursor = conn.cursor()
         data = None
         try:
-            data = cursor.execute("SELECT * FROM WORDS").fetchall()
+            # the rest of database is checked on its snapshot
+            data = cursor.execute("SELECT 1 FROM WORDS LIMIT 1").fetchall()
         # no table WORDS
         except sqlite3.OperationalError:
             self.status_bar.showMessage(
@@ -802,11 +1050,10 @@ class MainWindow(QtGui.QMainWindow):
             return False
         # database is malformed
         except sqlite3.DatabaseError:
-            self.status_bar.showMessage(
-                self.tr("Database is malformed. Click 'Repair'"))
-            self.logger.debug("%s is malformed", path)
-            self.kindle_repair_button.show()
+            self.showMalformed(path)
             return False
+        finally:
+            conn.close()
         # database is empty
         if not data:
             self.status_bar.showMessage(
@@ -816,23 +1063,24 @@ class MainWindow(QtGui.QMainWindow):
         self.logger.debug("%s - DB is OK", path)
         return True
 
+    def kindleCopyProgress(self, path, copied, total):
+        """
+        Progress of copying Kindle database to local snapshot.
+        Called from reading threads - only logged.
+        """
+        self.logger.debug("Copying %s - %i of %i pages",
+                          path, copied, total)
+
     def removeDuplicates(self):
         """
         Check for duplicates.
         The same word can appear with different context.
         """
-        temp = []
-        for row in self.array:
-            # remove repeated words
-            # list of occurences 5,4,3,2
-            occur = Counter(i['word'] for i in temp)
-            if not occur[row['word']]:
-                temp.append(row)
-
+        temp = removeDuplicates(self.array)
         wrong_count = len(self.array) - len(temp)
         if wrong_count > 0:
             self.logger.debug("%i words removed", wrong_count)
-        self.array = temp[:]
+        self.array = temp
 
     def kindleRepairDatabase(self):
         """
@@ -870,7 +1118,9 @@ class MainWindow(QtGui.QMainWindow):
         # 3) set new file path
         os.remove(temp_sql)
         self.kindle_repair_button.hide()
-        self.kindle_path.setText(new_name)
+        paths = [new_name if i == old_name else i
+                 for i in self.kindlePaths()]
+        self.kindle_path.setText(os.pathsep.join(paths))
         self.status_bar.showMessage(self.tr(
             "Ready to export."))
         text = self.tr("""
@@ -889,78 +1139,233 @@ class MainWindow(QtGui.QMainWindow):
         """
         self.status_bar.showMessage("")
 
-    def exportWords(self):
+    def readSource(self):
         """
-        Preparing and exporting words
+        Read words of selected source to self.array.
+        Return count of words before checking and name of source
+        or None if source is not OK.
         """
-        self.logger.debug("Starting export")
-
+        # clippings of previous source are not exported anymore
+        self.clippings = None
+        self.read_clippings = None
         # Input selected
         if self.input_radio.isChecked():
             if not self.inputOk():
                 self.logger.debug("Export refused - Input")
-                return
+                return None
             self.status_bar.showMessage(self.tr("Input > Lingualeo"))
             word = self.input_word_edit.text().lower().strip()
             context = self.input_context_edit.text()
             self.array = [{'word': word, 'context': context}]
             before = 1
+            source = "input"
             self.logger.debug("Export Input - Ready!")
 
         # Text selected
         elif self.text_radio.isChecked():
             if not self.textOk():
                 self.logger.debug("Export refused - Text")
-                return
+                return None
             self.status_bar.showMessage(self.tr("Txt > Lingualeo"))
-            handler = Text(self.file_name)
-            handler.read()
-            self.array = handler.get()
-            before = len(self.array)
+            if Clippings.isClippings(self.file_name):
+                # only highlights added since the last export
+                handler = Clippings(self.file_name)
+                handler.read()
+                self.array = handler.get()
+                before = len(self.array)
+                self.read_clippings = handler
+            elif Book.isBook(self.file_name):
+                handler = Book(self.file_name)
+                handler.read()
+                self.array = handler.get()
+                before = sum(i['count'] for i in self.array)
+            elif self.text_prose_check.isChecked():
+                handler = Prose(self.file_name)
+                handler.read()
+                self.array = handler.get()
+                before = sum(i['count'] for i in self.array)
+            else:
+                handler = Text(self.file_name)
+                handler.read()
+                self.array = handler.get()
+                before = len(self.array)
+            source = self.file_name
             self.logger.debug("Export Text - Ready!")
 
         # Kindle selected
         elif self.kindle_radio.isChecked():
             if not self.kindleOk():
                 self.logger.debug("Export refused - Kindle")
-                return
+                return None
             self.status_bar.showMessage(self.tr("Kindle > Lingualeo"))
-            handler = Kindle(self.file_name)
-            # @TEMPORARY
+            paths = self.kindlePaths()
+            handler = Kindle(paths,
+                             cache_dir=self.CACHE_DIR,
+                             progress=self.kindleCopyProgress)
             # The main idea is that our user
             # wants to see the same count of words as
             # on Kindle. We don't use word but stem
-            # so we temporary count distinct words.
-            # Until nltk module is implemented,
-            # this will be the temporary solution
+            # so handler counts distinct words for every stem,
+            # words merged into one lemma are duplicates.
+            # Words from different devices are counted separately,
+            # so the same word on two Kindles is a duplicate.
             only_new_words = self.kindle_new_words_radio.isChecked()
-            conn = sqlite3.connect(self.file_name)
-            if only_new_words:
-                command = "SELECT COUNT(DISTINCT word)\
-                            FROM WORDS WHERE category = 0"
-            else:
-                command = "SELECT COUNT(DISTINCT word)\
-                            FROM WORDS"
-            cur = conn.execute(command)
-            before = cur.fetchone()[0]
-            handler.read(only_new_words)
+            try:
+                handler.read(only_new_words)
+            except sqlite3.DatabaseError as e:
+                # snapshot didn't pass integrity check - show 'Repair'
+                self.showMalformed(getattr(e, 'path', paths[0]))
+                self.logger.debug("Export refused - Kindle is malformed")
+                return None
             self.array = handler.get()
+            before = handler.total
+            source = "kindle"
             self.logger.debug("Export Kindle - Ready!")
+        return before, source
+
+    def prepareWords(self):
+        """
+        Check words of self.array:
+        -validate.
+        -normalize to lemmas.
+        -remove duplicates.
+        Return rejected (not valid) rows.
+        """
+        # empty, not English, too short/long words
+        self.array, invalid = validate(self.array)
+        self.logger.debug("%i words rejected", len(invalid))
+        # watched, watching, watches - watch
+        self.lemmatizer.normalize(self.array)
+        self.removeDuplicates()
+        self.logger.debug("%i words after checking", len(self.array))
+        return invalid
+
+    def exportWords(self):
+        """
+        Preparing and exporting words
+        """
+        self.logger.debug("Starting export")
+        if not self.authReady():
+            self.logger.debug("Export is waiting for login")
+            return
+        result = self.readSource()
+        if result is None:
+            return
+        before, source = result
         self.logger.debug("%i words before checking", before)
+        invalid = self.prepareWords()
+        after = len(self.array)
+        common, last = self.filterCommon()
+        # reason is shown instead of translation
+        rejected = [{"word": i['word'],
+                     "result": Results.RESULTS['rj'],
+                     "tword": i['reason'],
+                     "context": i.get('context', '')} for i in invalid]
+        rejected += common
         if not self.lingualeoOk():
+            if isinstance(self.auth_task.error, (NoConnection, Timeout)):
+                self.queueWords(source, last)
             self.logger.debug("Export refused - Lingualeo")
             return
-        self.removeDuplicates()
-        after = len(self.array)
-        self.logger.debug("%i words after checking", after)
+        # not enough meatballs - the most valuable words go first.
+        # Words of history cost nothing (skipped) - they go before
+        # and don't take the budget.
+        known = self.dialog.history.known(self.dialog.KNOWN)
+        skipped = [i for i in self.array if i['word'].lower() in known]
+        rest = [i for i in self.array if i['word'].lower() not in known]
+        if not self.lingualeo.isEnoughMeatballs(len(rest) + len(last)):
+            self.array = skipped + prioritize(rest,
+                                              self.lingualeo.meatballs)
+            self.logger.debug("%i words prioritized",
+                              self.lingualeo.meatballs)
+        self.array += last
         total = before
-        duplicates = before - after
+        duplicates = before - after - len(invalid)
         self.dialog.setVariables(self.array,
                                  total,
                                  duplicates,
-                                 self.lingualeo)
+                                 self.lingualeo,
+                                 source,
+                                 rejected,
+                                 self.sessionSinks())
+        # offset of clippings is saved only after shown export
+        self.clippings = self.read_clippings
         self.dialog.exec_()
 
+    def sessionSinks(self):
+        """
+        Destinations of export session besides Lingualeo:
+        -session log.
+        -Anki deck of words in Lingualeo dictionary (added, exist)
+         and skipped (known from history) - only with translation.
+        """
+        sinks = []
+        if not (self.log_check.isChecked() or self.anki_check.isChecked()):
+            return sinks
+        os.makedirs(self.SESSION_DIR, exist_ok=True)
+        name = os.path.join(self.SESSION_DIR,
+                            time.strftime("session-%Y%m%d-%H%M%S"))
+        if self.log_check.isChecked():
+            sinks.append(Writer(name + ".csv"))
+        if self.anki_check.isChecked():
+            history = History()
+            deck = Deck(name + ".apkg",
+                        translations=history.translations(),
+                        translated_only=True)
+            history.close()
+            results = Results.KNOWN + (Results.RESULTS['sk'],)
+            sinks.append(Collector(deck.write, results))
+        return sinks
+
+    def saveWords(self):
+        """
+        Save checked words of selected source to file.
+        Lingualeo is not used.
+        Words are read and checked in memory as for export,
+        only writing is done in chunks (see writer).
+        """
+        name = QtGui.QFileDialog.getSaveFileName(
+            parent=self,
+            caption=self.tr("Save word list"),
+            filter=self.tr("CSV (*.csv);;TSV (*.tsv);;"
+                           "JSON Lines (*.jsonl)"))
+        if not name:
+            return
+        if os.path.splitext(name)[1].lower() not in FORMATS:
+            name += ".csv"
+        if self.readSource() is None:
+            return
+        self.prepareWords()
+        count = dump(self.array, name)
+        self.status_bar.showMessage(
+            self.tr("{0} words saved").format(count))
+        self.logger.debug("%i words saved to %s", count, name)
+
+    def exportAnki(self):
+        """
+        Save checked words of selected source as Anki deck.
+        Translations are taken from local history,
+        Lingualeo is not used.
+        """
+        name = QtGui.QFileDialog.getSaveFileName(
+            parent=self,
+            caption=self.tr("Export to Anki"),
+            filter=self.tr("Anki deck (*.apkg)"))
+        if not name:
+            return
+        if not name.lower().endswith(".apkg"):
+            name += ".apkg"
+        if self.readSource() is None:
+            return
+        self.prepareWords()
+        history = History()
+        translations = history.translations()
+        history.close()
+        count = Deck(name, translations=translations).write(self.array)
+        self.status_bar.showMessage(
+            self.tr("{0} words saved").format(count))
+        self.logger.debug("%i words saved to %s", count, name)
+
     def kindleTruncateEvent(self):
         """
         What to do when Truncate button is triggered
@@ -971,23 +1376,165 @@ class MainWindow(QtGui.QMainWindow):
             return
         self.truncate_sure_window.exec_()
 
-    def kindleTruncate(self):
-        """
-        Truncate Kindle database
-        Clear WORDS and LOOKUPS tables
-        """
-        self.file_name = self.kindle_path.text()
-        with sqlite3.connect(self.file_name) as conn:
-            conn.execute("DELETE FROM WORDS;")
-            conn.execute("DELETE FROM LOOKUPS;")
-            conn.execute("VACUUM;")
-            # @FROZEN - for future tests
-            # Seems, METADATA shouldn't be altered
-            # conn.execute("UPDATE METADATA SET sscnt = 0\
-            #     WHERE id in ('WORDS', 'LOOKUPS');")
-            #
+    def exportedIds(self):
+        """
+        Ids of Kindle words exported in this session:
+        {path: [WORDS.id]}
+        """
+        results = Results.KNOWN + (Results.RESULTS['sk'],)
+        stat = self.dialog.stat or Statistics()
+        exported = {row['word'] for row in stat.rows(results)}
+        ids = {}
+        for row in self.array or []:
+            if row['word'].lower() not in exported:
+                continue
+            for path, word_ids in row.get('ids', {}).items():
+                ids.setdefault(path, []).extend(word_ids)
+        return ids
+
+    def filterCommon(self):
+        """
+        Filter common words out of self.array if needed.
+        Return rows for statistics (skipped common words)
+        and common words to put last.
+        """
+        if not self.common_check.isChecked():
+            return [], []
+        self.array, common = self.frequency.split(
+            self.array, self.common_rank_spin.value())
+        self.logger.debug("%i common words", len(common))
+        if self.common_mode_combo.currentIndex() == self.COMMON_LAST:
+            return [], common
+        rejected = [{"word": i['word'],
+                     "result": Results.RESULTS['co'],
+                     "tword": "",
+                     "context": i.get('context', '')} for i in common]
+        return rejected, []
+
+    def queueWords(self, source, last=()):
+        """
+        No connection - queue words (not exported before)
+        for export when connection is back.
+        Common words put last are queued after the others
+        """
+        known = self.dialog.history.known(self.dialog.KNOWN)
+        rows = [i for i in self.array + list(last)
+                if i['word'].lower() not in known]
+        outbox = Outbox()
+        outbox.put(rows, source)
+        outbox.close()
+        self.status_bar.showMessage(
+            self.tr("No connection. {0} words are queued "
+                    "for export").format(len(rows)))
+        self.logger.debug("%i words queued", len(rows))
+        self.startOutbox()
+
+    def startOutbox(self):
+        """
+        Start export of queued words in background
+        """
+        email, password = self.credentials()
+        if not email or not password or self.outbox_task.isRunning():
+            return
+        outbox = Outbox()
+        count = len(outbox)
+        outbox.close()
+        if not count:
+            return
+        self.outbox_stat = []
+        self.outbox_task.setVariables(email, password)
+        self.outbox_task.start()
+        self.logger.debug("Outbox: %i words are waiting", count)
+
+    def outboxFlushed(self, rows, left):
+        """
+        Show progress of export of queued words
+        """
+        self.outbox_stat.extend(rows)
+        self.status_bar.showMessage(
+            self.tr("Queue: {0} words exported, "
+                    "{1} left").format(len(self.outbox_stat), left))
+
+    def outboxFinished(self):
+        """
+        Queued words are exported - show statistics
+        """
+        self.logger.debug("Outbox: %i words exported",
+                          len(self.outbox_stat))
+        if not self.outbox_stat:
+            return
+        self.outbox_window.setVariables(self.outbox_stat)
+        self.outbox_window.show()
+        self.outbox_stat = []
+
+    def kindleWriteProgress(self, done, total):
+        """
+        Show progress of writing to Kindle
+        """
+        self.status_bar.showMessage(
+            self.tr("Kindle: {0} of {1} words").format(done, total))
+
+    def kindleWriteFinished(self):
+        """
+        Writing to Kindle is over
+        """
+        self.kindle_truncate_button.setEnabled(self.kindle_radio.isChecked())
+        self.status_bar.showMessage(self.tr("Kindle database is updated"))
+
+    def exportFinished(self):
+        """
+        Export dialog is closed.
+        Remember parsed part of clippings if all its words are
+        exported - otherwise they are read again next time.
+        Mark exported Kindle words as mastered if needed
+        """
+        self.clearMessage()
+        if self.clippings and self.dialog.isComplete():
+            self.clippings.done()
+        self.clippings = None
+        if not self.kindle_mastered_check.isChecked():
+            return
+        paths = set(self.kindlePaths())
+        jobs = [(path, i) for path, i in self.exportedIds().items()
+                if path in paths]
+        if not jobs or self.kindle_task.isRunning():
+            return
+        self.kindle_task.setVariables(Kindle.markMastered, jobs)
+        self.kindle_task.start()
+        self.logger.debug("Marking %i databases as mastered", len(jobs))
+
+    def kindleTruncate(self, only_exported=False):
+        """
+        Truncate Kindle databases
+        Only exported words - in background, in small transactions.
+        Everything - clear WORDS and LOOKUPS tables
+        """
+        if self.kindle_task.isRunning():
+            return
+        if only_exported:
+            ids = self.exportedIds()
+            paths = set(self.kindlePaths())
+            jobs = [(path, i) for path, i in ids.items() if path in paths]
+            if not jobs:
+                self.status_bar.showMessage(
+                    self.tr("No exported words in this session"))
+                return
+            self.kindle_truncate_button.setEnabled(False)
+            self.kindle_task.setVariables(Kindle.truncate, jobs)
+            self.kindle_task.start()
+            return
+        for path in self.kindlePaths():
+            with sqlite3.connect(path) as conn:
+                conn.execute("DELETE FROM WORDS;")
+                conn.execute("DELETE FROM LOOKUPS;")
+                conn.execute("VACUUM;")
+                # @FROZEN - for future tests
+                # Seems, METADATA shouldn't be altered
+                # conn.execute("UPDATE METADATA SET sscnt = 0\
+                #     WHERE id in ('WORDS', 'LOOKUPS');")
+                #
+            self.logger.debug("Truncate success - %s", path)
         self.status_bar.showMessage(self.tr("Kindle database is empty"))
-        self.logger.debug("Truncate success - %s", self.file_name)
 
     def setPath(self):
         """
@@ -1003,14 +1550,23 @@ class MainWindow(QtGui.QMainWindow):
             self.file_name = QtGui.QFileDialog.getOpenFileName(
                 parent=self,
                 caption=self.tr("Select a file"),
-                filter=self.tr("Text files (*.txt)"))
+                filter=self.tr("Text files (*.txt *.gz *.bz2 *.xz "
+                               "*.epub *.html *.htm)"))
+            self.text_path.setText(self.file_name)
+            self.kindle_path.setText("")
+        elif self.sender().objectName() == "set_library":
+            self.file_name = QtGui.QFileDialog.getExistingDirectory(
+                parent=self,
+                caption=self.tr("Select a folder"))
             self.text_path.setText(self.file_name)
             self.kindle_path.setText("")
         elif self.sender().objectName() == "set_kindle":
-            self.file_name = QtGui.QFileDialog.getOpenFileName(
+            # several databases - one per device
+            names = QtGui.QFileDialog.getOpenFileNames(
                 parent=self,
                 caption=self.tr("Select a file"),
                 filter=self.tr("Databases (*.db)"))
+            self.file_name = os.pathsep.join(names)
             self.kindle_path.setText(self.file_name)
             self.text_path.setText("")
         # Every time, we select a new file
@@ -1038,11 +1594,19 @@ class MainWindow(QtGui.QMainWindow):
         self.kindle_repair_button.clicked.connect(self.kindleRepairDatabase)
         self.kindle_button.clicked.connect(self.setPath)
         self.text_button.clicked.connect(self.setPath)
+        self.text_library_button.clicked.connect(self.setPath)
         # actions for menu
         for i in self.lang_action_group.actions():
             i.triggered.connect(self.loadTranslation)
         self.exit_action.triggered.connect(self.close)
+        self.save_words_action.triggered.connect(self.saveWords)
+        self.anki_action.triggered.connect(self.exportAnki)
         self.about_action.triggered.connect(self.showAbout)
+        # login in background
+        self.auth_task.finished.connect(self.authFinished)
+        self.auth_timer.timeout.connect(self.startAuth)
+        self.email_edit.textChanged.connect(self.credentialsChanged)
+        self.pass_edit.textChanged.connect(self.credentialsChanged)
 
     def loadTranslation(self):
         """
@@ -1074,6 +1638,9 @@ class MainWindow(QtGui.QMainWindow):
             self.settings.setValue("password", self.pass_edit.text())
         if self.language:
             self.settings.setValue("language", self.language)
+        self.auth_task.wait()
+        self.outbox_task.stop()
+        self.outbox_task.wait()
         QtGui.QApplication.quit()
 
     def loadDefaults(self):
@@ -1095,6 +1662,7 @@ class MainWindow(QtGui.QMainWindow):
         if email:
             self.email_edit.setText(email)
             self.pass_edit.setText(password)
+            self.startAuth()
 
     def closeEvent(self, event):
         """
@@ -1108,93 +1676,206 @@ class MainWindow(QtGui.QMainWindow):
 
 class Results(object):
     """
-    Helper class for storing constants.
+    Helper class for storing constants (see service).
     """
-    RESULTS = {'ad': "added",
-               'no_ad': "not added",
-               'no_tr': "no translation",
-               'ex': "exists"}
+    RESULTS = service.RESULTS
+    KNOWN = service.KNOWN
+    # results that mean - word doesn't need export anymore
+    FINAL = KNOWN + (RESULTS['no_tr'], RESULTS['sk'])
 
 
 class WorkThread(QtCore.QThread, Results):
     """
     Class for backgroung upload with progressbar updated
     GUI doesn't get stuck while uploading
+    Two stages connected by a bounded queue:
+    -translate (helper thread) - gets translations ahead.
+    -add (this thread) - adds words and reports them,
+     rows are passed to other sinks (fanout).
     """
     punched = QtCore.pyqtSignal(dict)
+    throughput = QtCore.pyqtSignal(dict)
+    # translations waiting for upload
+    QUEUE_SIZE = 10
+    # end of translate stage
+    DONE = None
 
     def __init__(self):
         super(WorkThread, self).__init__()
         self.logger = setLogger(name='WorkThread')
-
-    def setVariables(self, lingualeo):
-        """
-        Set lingualeo for WorkThread
+        self.stopped = threading.Event()
+        self.speed = {'translate': 0, 'add': 0}
+        self.known = set()
+        self.fanout = None
+        self.translator = None
+        # meatballs which can be spent, None - premium
+        self.budget = None
+
+    def setVariables(self, lingualeo, known=None, fanout=None,
+                     dictionaries=None):
+        """
+        Set lingualeo for WorkThread,
+        words known from local history,
+        sinks for rows of export
+        and local dictionaries - they are asked before Lingualeo
         """
         self.lingualeo = lingualeo
+        self.known = known or set()
+        self.fanout = fanout
+        self.translator = Translator(list(dictionaries or []) + [lingualeo])
 
     def __del__(self):
         """Delete thread"""
         self.wait()
 
-    def run(self):
-        """Run thread"""
-        result = None
-        row = None
-        data = None
-        for i in self.array:
+    @staticmethod
+    def put(items, item, stopped):
+        """
+        Put item to queue.
+        Wait while queue is full, give up if stopped.
+        """
+        while not stopped.is_set():
             try:
-                word = i.get('word').lower()
-                context = i.get('context', '')
-                # Detect non-Unicode characters
-                word.encode('ascii')
-                response = self.lingualeo.get_translate(word)
-                translate = response['tword']
-                exist = response['is_exist']
-                if exist:
-                    result = self.RESULTS['ex']
-                else:
-                    if translate == '':
-                        result = self.RESULTS['no_tr']
-                    else:
-                        # @TEMP solution - to detect mysterious latin
-                        before = self.RESULTS['ad']
-                        response = self.lingualeo.add_word(word,
-                                                           translate,
-                                                           context)
-                        after = self.RESULTS['ad'] if \
-                            response.json()['is_new'] \
-                            else self.RESULTS['no_tr']
-                        if before != after:
-                            self.logger.debug("Mysterious - %s", word)
-                        result = after
-
-                row = {"word": word,
-                       "result": result,
-                       "tword": translate,
-                       "context": context}
-                data = {"sent": True,
-                        "row": row}
+                items.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def translate(self, items, stopped):
+        """
+        Translate stage.
+        Get translation for every word and pass it to add stage.
+        No connection - the stage is over, the rest is queued.
+        """
+        started = time.time()
+        for count, i in enumerate(self.array, 1):
+            if stopped.is_set():
+                return
+            word = i.get('word').lower()
+            context = i.get('context', '')
+            item = {"word": word,
+                    "context": context}
+            if word in self.known:
+                item['tword'] = ''
+                item['exist'] = True
+                item['result'] = self.RESULTS['sk']
+                self.put(items, item, stopped)
+                continue
+            # words are validated before export - see validate
+            try:
+                begin = time.time()
+                response = self.translator.get_translate(word)
+                item['duration'] = time.time() - begin
+                item['tword'] = response['tword']
+                item['exist'] = response['is_exist']
+                item['local'] = response['local']
+            except (NoConnection, Timeout):
+                self.logger.debug("Couldn't translate words")
+                self.put(items, {"sent": False, "row": None}, stopped)
+                break
+            self.speed['translate'] = count / (time.time() - started)
+            self.put(items, item, stopped)
+        self.put(items, self.DONE, stopped)
+
+    def add(self, item):
+        """
+        Add stage for one translated word.
+        Return data for progress.
+        """
+        if 'sent' in item:
+            return item
+        word = item['word']
+        translate = item['tword']
+        context = item['context']
+        result = item.get('result')
+        # seconds spent on requests for this word
+        duration = item.get('duration', 0)
+        if result:
+            pass
+        elif item['exist']:
+            result = self.RESULTS['ex']
+        elif translate == '':
+            result = self.RESULTS['no_tr']
+        elif self.budget is not None and self.budget <= 0:
+            # meatballs are over - word is not sent
+            result = self.RESULTS['no_ad']
+        else:
+            # @TEMP solution - to detect mysterious latin
+            before = self.RESULTS['ad']
+            try:
+                begin = time.time()
+                response = self.lingualeo.add_word(word,
+                                                   translate,
+                                                   context)
+                duration += time.time() - begin
             except (NoConnection, Timeout):
-                data = {"sent": False,
-                        "row": None}
                 self.logger.debug("Couldn't upload words")
-            except UnicodeEncodeError:
-                row = {"word": word,
-                       "result": self.RESULTS['no_tr'],
-                       "tword": '',
-                       "context": context}
-                data = {"sent": True,
-                        "row": row}
-                self.logger.debug("% is not English", word)
-            finally:
-                self.punched.emit(data)
-            time.sleep(0.1)
+                return {"sent": False,
+                        "row": None}
+            # local translation - Lingualeo wasn't asked if word
+            # is in user's dictionary, it tells it now
+            if response.json()['is_new']:
+                after = self.RESULTS['ad']
+            elif item.get('local'):
+                after = self.RESULTS['ex']
+            else:
+                after = self.RESULTS['no_tr']
+            if before != after and not item.get('local'):
+                self.logger.debug("Mysterious - %s", word)
+            result = after
+        row = {"word": word,
+               "result": result,
+               "tword": translate,
+               "context": context,
+               "duration": round(duration, 3)}
+        return {"sent": True,
+                "row": row}
+
+    def run(self):
+        """Run thread"""
+        stopped = threading.Event()
+        self.stopped = stopped
+        self.speed = {'translate': 0, 'add': 0}
+        self.budget = None
+        if not self.lingualeo.premium:
+            self.budget = self.lingualeo.meatballs - Lingualeo.NO_MEATBALLS
+        items = queue.Queue(maxsize=self.QUEUE_SIZE)
+        translator = threading.Thread(target=self.translate,
+                                      args=(items, stopped))
+        translator.daemon = True
+        translator.start()
+        started = time.time()
+        count = 0
+        while True:
+            item = items.get()
+            if item is self.DONE:
+                break
+            data = self.add(item)
+            if data['sent'] and self.fanout:
+                self.fanout.put(data['row'])
+            count += 1
+            self.speed['add'] = count / (time.time() - started)
+            self.punched.emit(data)
+            self.throughput.emit(dict(self.speed))
+            if not data['sent']:
+                # no connection - nothing is uploaded anymore
+                stopped.set()
+                break
+            if self.budget is not None and \
+                    data['row']['result'] == self.RESULTS['ad']:
+                self.budget -= 1
+                if self.budget <= 0:
+                    # meatballs are over - GUI stops export
+                    stopped.set()
+                    break
+        self.logger.debug("Translate: %.2f words/s, add: %.2f words/s",
+                          self.speed['translate'], self.speed['add'])
 
     def stop(self):
         """
-        Stop upload - stop thread.
+        Stop upload - stop both stages.
         """
+        self.stopped.set()
         self.terminate()
         self.logger.debug("Stopped upload")
 
@@ -1208,6 +1889,177 @@ class WorkThread(QtCore.QThread, Results):
         self.logger.debug("Got array of %i words", len(self.array))
 
 
+class OutboxThread(QtCore.QThread):
+    """
+    Class for background export of queued words.
+    Waits until Lingualeo is reachable, then exports
+    words in batches. Stops when queue is empty or
+    meatballs are over.
+    Session is logged in once (or restored from keyring) and
+    only checked on next attempts.
+    """
+    flushed = QtCore.pyqtSignal(list, int)
+    # seconds between checks of connection
+    INTERVAL = 30
+
+    def __init__(self):
+        super(OutboxThread, self).__init__()
+        self.stopped = threading.Event()
+        self.logger = setLogger(name='OutboxThread')
+
+    def setVariables(self, email, password):
+        """
+        Set email/password for login
+        """
+        self.email = email
+        self.password = password
+
+    def run(self):
+        """Run thread"""
+        self.stopped.clear()
+        outbox = Outbox()
+        history = History()
+        lingualeo = Lingualeo(self.email, self.password)
+
+        def report(rows):
+            history.add(rows)
+            self.flushed.emit(rows, len(outbox))
+
+        while len(outbox) and not self.stopped.is_set():
+            if lingualeo.isReachable():
+                try:
+                    if not AuthThread.restore(lingualeo):
+                        lingualeo.auth()
+                        secure.save(lingualeo.user(),
+                                    lingualeo.exportSession())
+                    lingualeo.initUser()
+                    flush(outbox, lingualeo,
+                          progress=report,
+                          stopped=self.stopped)
+                except (NoConnection, Timeout):
+                    self.logger.debug("Connection is lost")
+                except KeyError:
+                    self.logger.debug("Email or password are incorrect")
+                    break
+                if lingualeo.meatballs == Lingualeo.NO_MEATBALLS:
+                    self.logger.debug("0 meatballs. Queue is kept")
+                    break
+                if not len(outbox):
+                    break
+            self.stopped.wait(self.INTERVAL)
+        outbox.close()
+        history.close()
+
+    def stop(self):
+        """
+        Stop export of queue
+        """
+        self.stopped.set()
+
+
+class AuthThread(QtCore.QThread):
+    """
+    Class for login to Lingualeo in background.
+    Saved session (keyring) is reused if it is still valid.
+    """
+
+    def __init__(self):
+        super(AuthThread, self).__init__()
+        self.setVariables("", "")
+
+    def setVariables(self, email, password, previous=None):
+        """
+        Set email/password.
+        previous - Lingualeo of previous login, its session
+        is checked and info about user is refreshed.
+        """
+        self.email = email
+        self.password = password
+        self.previous = previous
+        self.lingualeo = None
+        self.error = None
+        self.restored = False
+
+    def isFor(self, email, password):
+        """
+        Login was done for these email/password
+        """
+        return self.lingualeo is not None and \
+            (self.email, self.password) == (email, password)
+
+    @staticmethod
+    def restore(lingualeo):
+        """
+        Reuse session (of previous login or saved) if it is
+        still valid and info about user is received with it
+        """
+        if lingualeo.cookies is None:
+            session = secure.load(lingualeo.user())
+            if not session or not lingualeo.restoreSession(session):
+                return False
+        return lingualeo.isSessionValid() and \
+            lingualeo.auth_info is not None
+
+    def run(self):
+        """Run thread"""
+        lingualeo = self.previous or Lingualeo(self.email, self.password)
+        avatar = lingualeo.avatar
+        try:
+            self.restored = self.restore(lingualeo)
+            if not self.restored:
+                lingualeo.auth()
+            lingualeo.initUser()
+            # the same user - avatar is not loaded again
+            if self.previous:
+                lingualeo.avatar = avatar
+        except (NoConnection, Timeout, KeyError) as e:
+            self.error = e
+        self.lingualeo = lingualeo
+
+
+class AvatarThread(QtCore.QThread):
+    """
+    Class for background loading of user's avatar
+    """
+    loaded = QtCore.pyqtSignal(object)
+
+    def setVariables(self, lingualeo):
+        """
+        Set lingualeo for AvatarThread
+        """
+        self.lingualeo = lingualeo
+
+    def run(self):
+        """Run thread"""
+        self.loaded.emit(self.lingualeo.loadAvatar())
+
+
+class KindleWriteThread(QtCore.QThread):
+    """
+    Class for background writing to Kindle databases.
+    GUI doesn't get stuck while slow device is written
+    """
+    progressed = QtCore.pyqtSignal(int, int)
+
+    def __init__(self):
+        super(KindleWriteThread, self).__init__()
+        self.jobs = []
+        self.logger = setLogger(name='KindleWriteThread')
+
+    def setVariables(self, function, jobs):
+        """
+        Function to call for every (path, ids) job
+        """
+        self.function = function
+        self.jobs = jobs
+
+    def run(self):
+        """Run thread"""
+        for path, ids in self.jobs:
+            self.function(path, ids, progress=self.progressed.emit)
+            self.logger.debug("%i words written - %s", len(ids), path)
+
+
 class ExportDialog(CustomDialog, Results):
     """
     Dialog for exporting words.
@@ -1218,7 +2070,13 @@ class ExportDialog(CustomDialog, Results):
     """
 
     ICON_FILE = os.path.join("src", "pics", "export.ico")
+    # shown while avatar is loading
+    AVATAR_FILE = os.path.join("src", "pics", "lingualeo.ico")
     closed = QtCore.pyqtSignal()
+    # words are queued because of no connection
+    queued = QtCore.pyqtSignal()
+    # rows of history saved in one transaction
+    HISTORY_CHUNK = 50
 
     def __init__(self):
         """
@@ -1236,34 +2094,65 @@ class ExportDialog(CustomDialog, Results):
         super(ExportDialog, self).__init__()
         self.stat = None
         self.value = None
+        self.is_finished = False
         self.array = None
         self.words_count = None
         self.total = None
         self.duplicates = None
+        self.rejected = None
         self.lingualeo = None
+        self.source = None
+        self.fanout = FanOut([])
+        self.history = History()
+        # rows of history not saved yet
+        self.unsaved = []
+        # StarDict dictionaries of src/dicts
+        self.dictionaries = loadDictionaries()
         self.stat_window = StatisticsDialog()
         self.task = WorkThread()
+        self.avatar_task = AvatarThread()
         self.initUI()
         self.initActions()
         self.logger = setLogger(name='Export')
+        self.logger.debug("%i local dictionaries",
+                          len(self.dictionaries))
         self.logger.debug("Inited ExportDialog")
 
-    def setVariables(self, array, total, duplicates, lingualeo):
+    def setVariables(self, array, total, duplicates, lingualeo, source="",
+                     rejected=None, sinks=None):
         """
-        Init variables of ExportDialog
+        Init variables of ExportDialog.
+        rejected - rows filtered out before export, they go
+        straight to statistics.
+        sinks - destinations besides Lingualeo (see fanout),
+        they get every row of statistics.
         """
-        self.stat = []
+        self.stat = Statistics()
+        self.fanout = FanOut(sinks or [])
+        self.addStat(rejected or [])
+        self.rejected = len(self.stat)
         self.value = 0
         self.array = array
         self.words_count = len(array)
         self.total = total
         self.duplicates = duplicates
         self.lingualeo = lingualeo
-        self.task.setVariables(lingualeo)
+        self.source = source
+        self.is_finished = False
+        self.task.setVariables(lingualeo,
+                               self.history.known(self.KNOWN),
+                               self.fanout,
+                               self.dictionaries)
         self.progress_bar.setValue(0)
         self.progress_bar.setFormat("0%")
+        self.speed_label.setText("")
+        self.counts_label.setText("")
         self.task.getData(array)
         self.retranslateUI()
+        if self.lingualeo.avatar is None and \
+                not self.avatar_task.isRunning():
+            self.avatar_task.setVariables(lingualeo)
+            self.avatar_task.start()
 
     def initUI(self):
         """
@@ -1295,10 +2184,14 @@ class ExportDialog(CustomDialog, Results):
         self.duplicate_words_value_label = QtGui.QLabel()
         info_grid_layout.addWidget(self.duplicate_words_title_label, 4, 0)
         info_grid_layout.addWidget(self.duplicate_words_value_label, 4, 1)
+        self.rejected_words_title_label = QtGui.QLabel()
+        self.rejected_words_value_label = QtGui.QLabel()
+        info_grid_layout.addWidget(self.rejected_words_title_label, 5, 0)
+        info_grid_layout.addWidget(self.rejected_words_value_label, 5, 1)
         self.prepared_words_title_label = QtGui.QLabel()
         self.prepared_words_value_label = QtGui.QLabel()
-        info_grid_layout.addWidget(self.prepared_words_title_label, 5, 0)
-        info_grid_layout.addWidget(self.prepared_words_value_label, 5, 1)
+        info_grid_layout.addWidget(self.prepared_words_title_label, 6, 0)
+        info_grid_layout.addWidget(self.prepared_words_value_label, 6, 1)
 
         info_layout.addWidget(self.avatar_label)
         info_layout.addLayout(info_grid_layout)
@@ -1320,7 +2213,13 @@ class ExportDialog(CustomDialog, Results):
         self.break_button = QtGui.QPushButton()
         self.break_button.setObjectName("break")
 
+        self.speed_label = QtGui.QLabel()
+        self.speed_label.setAlignment(QtCore.Qt.AlignCenter)
+        self.counts_label = QtGui.QLabel()
+        self.counts_label.setAlignment(QtCore.Qt.AlignCenter)
         progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.speed_label)
+        progress_layout.addWidget(self.counts_label)
         hor_layout.addWidget(self.start_button)
         hor_layout.addWidget(self.break_button)
         progress_layout.addLayout(hor_layout)
@@ -1339,9 +2238,7 @@ class ExportDialog(CustomDialog, Results):
         Set texts for buttons/labels of ExportDialog
         """
         self.setWindowIcon(QtGui.QIcon(self.ICON_FILE))
-        avatar = QtGui.QPixmap()
-        avatar.loadFromData(self.lingualeo.avatar)
-        self.avatar_label.setPixmap(avatar)
+        self.setAvatar(self.lingualeo.avatar)
         self.avatar_label.setAlignment(QtCore.Qt.AlignCenter)
         self.progress_bar.setRange(0, self.words_count)
         # self.avatar_label.setScaledContents(True)
@@ -1376,6 +2273,10 @@ class ExportDialog(CustomDialog, Results):
             self.tr("Duplicates removed:"))
         self.duplicate_words_value_label.setText(
             str(self.duplicates))
+        self.rejected_words_title_label.setText(
+            self.tr("Filtered out:"))
+        self.rejected_words_value_label.setText(
+            str(self.rejected))
         self.prepared_words_title_label.setText(
             self.tr("Prepared to export:"))
         self.prepared_words_value_label.setText(
@@ -1387,6 +2288,15 @@ class ExportDialog(CustomDialog, Results):
         self.break_button.setText(
             self.tr("Break"))
 
+    def setAvatar(self, data):
+        """
+        Show avatar or placeholder if there is no avatar (yet)
+        """
+        avatar = QtGui.QPixmap()
+        if not data or not avatar.loadFromData(data):
+            avatar = QtGui.QPixmap(self.AVATAR_FILE)
+        self.avatar_label.setPixmap(avatar)
+
     def initActions(self):
         """
         Initializing actions for ExportDialog
@@ -1397,6 +2307,8 @@ class ExportDialog(CustomDialog, Results):
         self.break_button.clicked.connect(self.task.stop)
         self.break_button.clicked.connect(self.close)
         self.task.punched.connect(self.onProgress)
+        self.task.throughput.connect(self.onThroughput)
+        self.avatar_task.loaded.connect(self.setAvatar)
 
     def keyPressEvent(self, event):
         """
@@ -1415,6 +2327,9 @@ class ExportDialog(CustomDialog, Results):
         """
         event.accept()
         self.task.stop()
+        self.saveHistory()
+        for sink, error in self.fanout.close().items():
+            self.logger.debug("%s failed - %s", type(sink).__name__, error)
         self.stat_window.setVariables(self.stat)
         self.stat_window.exec_()
         if self.start_button.isHidden():
@@ -1451,15 +2366,81 @@ class ExportDialog(CustomDialog, Results):
         """
         Process finish:
         -set 'Finished' and 'Close'
+        Rows which come later are ignored.
         """
+        self.is_finished = True
         self.progress_bar.setFormat(self.tr("Finished"))
         self.break_button.setText(self.tr("Close"))
         self.start_button.hide()
 
+    def saveHistory(self):
+        """
+        Save processed rows to history in one transaction
+        """
+        if self.unsaved:
+            self.history.add(self.unsaved, self.source)
+            self.unsaved = []
+
+    def addStat(self, rows):
+        """
+        Add rows which are not exported to statistics and sinks
+        """
+        self.stat.addMany(rows)
+        self.fanout.putMany(rows)
+
+    def addRest(self, result, rows=None):
+        """
+        Words which weren't processed (or given rows) got result.
+        Statistics gets them as one range, rows are made
+        only for sinks if there are any.
+        """
+        array, start = (self.array, self.value) if rows is None \
+            else (rows, 0)
+        self.stat.addRange(result, array, start)
+        if self.fanout:
+            self.fanout.putMany(Statistics.rangeRows(result,
+                                                     array,
+                                                     start,
+                                                     len(array)))
+
+    def isComplete(self):
+        """
+        Every word of export got final result
+        """
+        if self.stat is None:
+            return False
+        done = sum(self.stat.count(i) for i in self.FINAL)
+        return done == self.words_count
+
+    def showCounts(self):
+        """
+        Show counts of results while export goes
+        """
+        self.counts_label.setText(
+            self.tr("Added: {0}, exist: {1}, no translation: {2}, "
+                    "skipped: {3}").format(
+                self.stat.count(self.RESULTS['ad']),
+                self.stat.count(self.RESULTS['ex']),
+                self.stat.count(self.RESULTS['no_tr']),
+                self.stat.count(self.RESULTS['sk'])))
+
+    def onThroughput(self, speed):
+        """
+        Show words per second of translate and add stages.
+        """
+        self.speed_label.setText(
+            self.tr("Lookup: {0:.1f} words/s, "
+                    "upload: {1:.1f} words/s").format(speed['translate'],
+                                                      speed['add']))
+
     def onProgress(self, data):
         """
         Process every word.
+        Rows after finish (e.g. sent while meatballs were
+        counted) are ignored.
         """
+        if self.is_finished:
+            return
         if data['sent']:
             row = data['row']
             if (row['result'] == self.RESULTS['ad'] and
@@ -1469,14 +2450,36 @@ class ExportDialog(CustomDialog, Results):
                 self.meatballs_value_label.setText(
                     str(self.lingualeo.meatballs))
         else:
-            self.start_button.click()
-            warning = NotificationDialog(self.tr("Internet error"),
-                                         self.tr("No Internet Connection"))
-            warning.exec_()
-            self.logger.debug("No connection")
+            # no connection - the rest is queued for later export,
+            # words of history are skipped as by WorkThread
+            self.task.stop()
+            rest, skipped = [], []
+            for i in self.array[self.value:]:
+                if i['word'].lower() in self.task.known:
+                    skipped.append(i)
+                else:
+                    rest.append(i)
+            outbox = Outbox()
+            outbox.put(rest, self.source)
+            outbox.close()
+            self.addRest(self.RESULTS['sk'], skipped)
+            self.addRest(self.RESULTS['qu'], rest)
+            self.progress_bar.setValue(self.progress_bar.maximum())
+            self.warning_info_label.setText(
+                self.tr("No connection. {0} words are queued "
+                        "for export").format(len(rest)))
+            self.logger.debug("No connection. %i words queued", len(rest))
+            self.finish()
+            self.queued.emit()
             return
 
-        self.stat.append(data['row'])
+        # row is passed to sinks by WorkThread
+        self.stat.add(data['row'])
+        self.showCounts()
+        if data['row']['result'] != self.RESULTS['sk']:
+            self.unsaved.append(data['row'])
+            if len(self.unsaved) >= self.HISTORY_CHUNK:
+                self.saveHistory()
         self.value += 1
         self.progress_bar.setValue(self.value)
         self.progress_bar.setFormat(
@@ -1488,11 +2491,7 @@ class ExportDialog(CustomDialog, Results):
             self.progress_bar.setValue(self.progress_bar.maximum())
             self.warning_info_label.setText(
                 self.tr("No meatballs. Upload stopped"))
-            for i in self.array[self.value:]:
-                self.stat.append({"word": i['word'],
-                                  "result": self.RESULTS['no_ad'],
-                                  "tword": "",
-                                  "context": i['context']})
+            self.addRest(self.RESULTS['no_ad'])
             self.logger.debug("0 meatballs. Upload stopped")
             self.finish()
             return
@@ -1529,17 +2528,29 @@ class StatisticsDialog(CustomFullDialog, Results):
 
     def setVariables(self, stat):
         """
-        Init variables for StatisticsDialog
+        Init variables for StatisticsDialog.
+        stat - Statistics or list of rows
         """
-        self.stat = sorted(stat, key=itemgetter('result'))
+        if not isinstance(stat, Statistics):
+            stat = Statistics(stat)
+        self.stat = stat
         self.table.setRowCount(0)
-        for item in self.stat:
+        self.table.setRowCount(len(stat))
+        for row_position, item in enumerate(stat.rows()):
             if item.get("result") == self.RESULTS['ad']:
                 brush = QtCore.Qt.green
             elif item.get("result") == self.RESULTS['no_tr']:
                 brush = QtCore.Qt.yellow
             elif item.get("result") == self.RESULTS['no_ad']:
                 brush = QtCore.Qt.white
+            elif item.get("result") == self.RESULTS['sk']:
+                brush = QtCore.Qt.cyan
+            elif item.get("result") == self.RESULTS['qu']:
+                brush = QtCore.Qt.lightGray
+            elif item.get("result") == self.RESULTS['co']:
+                brush = QtCore.Qt.magenta
+            elif item.get("result") == self.RESULTS['rj']:
+                brush = QtCore.Qt.gray
             else:
                 brush = QtCore.Qt.red
             word = QtGui.QTableWidgetItem(item.get("word"))
@@ -1548,18 +2559,20 @@ class StatisticsDialog(CustomFullDialog, Results):
             word.setBackgroundColor(brush)
             translate.setBackgroundColor(brush)
             context.setBackgroundColor(brush)
-            row_position = self.table.rowCount()
-            self.table.insertRow(row_position)
             self.table.setItem(row_position, 0, word)
             self.table.setItem(row_position, 1, translate)
             self.table.setItem(row_position, 2, context)
 
-        total = len(self.stat)
-        result = Counter(i["result"] for i in self.stat)
-        added = result[self.RESULTS['ad']]
-        not_added = result[self.RESULTS['no_ad']]
-        wrong = result[self.RESULTS['no_tr']]
-        exist = len(self.stat) - (added+not_added) - wrong
+        total = len(stat)
+        added = stat.count(self.RESULTS['ad'])
+        not_added = stat.count(self.RESULTS['no_ad'])
+        wrong = stat.count(self.RESULTS['no_tr'])
+        skipped = stat.count(self.RESULTS['sk'])
+        queued = stat.count(self.RESULTS['qu'])
+        common = stat.count(self.RESULTS['co'])
+        rejected = stat.count(self.RESULTS['rj'])
+        exist = total - (added+not_added) - wrong - skipped - \
+            queued - common - rejected
 
         data = [
                 {"text": self.tr("Total"),
@@ -1575,7 +2588,19 @@ class StatisticsDialog(CustomFullDialog, Results):
                  "value": wrong, "color": "yellow"},
                 {"text": self.tr("Not added"),
                  "value": not_added,
-                 "color": "white"}
+                 "color": "white"},
+                {"text": self.tr("Skipped (exported before)"),
+                 "value": skipped,
+                 "color": "cyan"},
+                {"text": self.tr("Queued (no connection)"),
+                 "value": queued,
+                 "color": "lightgray"},
+                {"text": self.tr("Common words (skipped)"),
+                 "value": common,
+                 "color": "magenta"},
+                {"text": self.tr("Rejected (not valid)"),
+                 "value": rejected,
+                 "color": "gray"}
                ]
 
         for index, i in enumerate(data):
@@ -1770,6 +2795,8 @@ def detectOtherVersions():
 
 
 def main():
+    # process pool of Prose handler in frozen executable
+    multiprocessing.freeze_support()
 
     # Let only one instance of program running
     # this version.
@@ -4,13 +4,300 @@
 ===Description===
 Module for configuring handlers.
 Every handler converts its input to self.data
+Text handlers read .gz, .bz2 and .xz files as they are.
 
-Kindle - from Kindle db.
+Kindle - from Kindle db (one or several devices).
 Text - from txt file.
+Prose - from plain text (books, articles).
+Book - from e-books (EPUB, HTML), one book or a library folder.
+Clippings - from Kindle's highlights (My Clippings.txt).
 Input - from manual input
 """
 
+import io
+import os
+import re
+import bz2
+import json
+import gzip
+import lzma
+import mmap
+import hashlib
 import sqlite3
+import zipfile
+import posixpath
+from html.parser import HTMLParser
+from xml.etree import ElementTree
+from urllib.parse import unquote
+from collections import Counter, deque
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.request import pathname2url
+
+WORD_PATTERN = re.compile(r"[A-Za-z]+(?:['-][A-Za-z]+)*")
+SENTENCE_PATTERN = re.compile(r"[^.!?]+[.!?]*")
+SENTENCE_END = re.compile(rb"[.!?][\s\"')\]]")
+# magic bytes - module for decompression
+COMPRESSIONS = ((b'\x1f\x8b', gzip),
+                (b'BZh', bz2),
+                (b'\xfd7zXZ\x00', lzma))
+# markup - text of these tags is a separate paragraph
+BLOCK_TAGS = {'p', 'div', 'br', 'li', 'tr', 'td', 'blockquote', 'section',
+              'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+# markup - text of these tags is not read
+SKIP_TAGS = {'head', 'script', 'style'}
+MARKUP_EXTENSIONS = ('.xhtml', '.html', '.htm')
+
+
+def compression(path):
+    """
+    Module for decompression of file (by magic bytes)
+    or None for not compressed file.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(6)
+    for magic, module in COMPRESSIONS:
+        if head.startswith(magic):
+            return module
+    return None
+
+
+def openText(path):
+    """
+    Open text file for reading.
+    Compressed file is decompressed while reading.
+    """
+    module = compression(path)
+    if module:
+        return module.open(path, 'rt')
+    return open(path, 'r')
+
+
+def readOnlyUri(path):
+    """
+    URI for opening database read-only.
+    'immutable' - no locks and no journal on device.
+    """
+    return "file:{}?mode=ro&immutable=1".format(
+        pathname2url(os.path.abspath(path)))
+
+
+class MalformedError(sqlite3.DatabaseError):
+    """
+    Snapshot of database didn't pass integrity check.
+    path - the original database.
+    """
+
+    def __init__(self, path, check):
+        super(MalformedError, self).__init__(
+            "{} is malformed - {}".format(path, check))
+        self.path = path
+
+
+def dumpCopy(original, target, progress=None):
+    """
+    Copy database by SQL dump.
+    For Python < 3.7 - there is no Connection.backup.
+    Return connection to the copy.
+    """
+    if target != ":memory:" and os.path.exists(target):
+        os.remove(target)
+    conn = sqlite3.connect(target)
+    conn.executescript("\n".join(original.iterdump()))
+    if progress:
+        progress(0, 0, 1)
+    return conn
+
+
+def snapshot(source, target=":memory:", pages=256, progress=None):
+    """
+    Copy database to target (file or memory) by SQLite
+    online backup API, 'pages' pages per step.
+    progress(status, remaining, total) is called after every step.
+    Integrity of the copy is checked - the original (e.g. on device)
+    is read only once. Raise MalformedError if it is broken.
+    Return connection to the copy, tuned for reading.
+    """
+    original = sqlite3.connect(readOnlyUri(source), uri=True)
+    try:
+        if hasattr(original, 'backup'):
+            conn = sqlite3.connect(target)
+            original.backup(conn, pages=pages, progress=progress)
+        else:
+            conn = dumpCopy(original, target, progress)
+    finally:
+        original.close()
+    try:
+        check = conn.execute("PRAGMA quick_check").fetchone()
+    except sqlite3.DatabaseError as e:
+        check = (str(e),)
+    if check != ('ok',):
+        conn.close()
+        if target != ":memory:":
+            os.remove(target)
+        raise MalformedError(source, check[0])
+    conn.execute("PRAGMA cache_size = -65536")
+    conn.execute("PRAGMA mmap_size = 268435456")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("CREATE INDEX IF NOT EXISTS LOOKUPS_WORD_KEY \
+                    ON LOOKUPS (word_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS WORDS_LANG_CATEGORY \
+                    ON WORDS (lang, category)")
+    return conn
+
+
+def countText(text, min_length=2):
+    """
+    Count words of text.
+    Return Counter of lowercased words and dictionary
+    word - first sentence with this word.
+    """
+    counter = Counter()
+    contexts = {}
+    for sentence in SENTENCE_PATTERN.findall(text):
+        words = WORD_PATTERN.findall(sentence.lower())
+        counter.update(words)
+        new_words = set(words).difference(contexts)
+        if new_words:
+            context = ' '.join(sentence.split())
+            contexts.update(dict.fromkeys(new_words, context))
+    for word in [i for i in contexts if len(i) < min_length]:
+        del counter[word]
+        del contexts[word]
+    return counter, contexts
+
+
+def countSlice(path, start, end):
+    """
+    Count words in [start:end] bytes of file.
+    Runs in worker process - file is mapped again here,
+    only the result goes back to the parent.
+    """
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            text = m[start:end].decode('utf-8', errors='ignore')
+    return countText(text)
+
+
+class TextExtractor(HTMLParser):
+    """
+    Incremental parser of markup.
+    Text is collected paragraph by paragraph, so sentences
+    of different paragraphs are not glued together.
+    """
+
+    def __init__(self):
+        super(TextExtractor, self).__init__(convert_charrefs=True)
+        self.skip = 0
+        self.text = []
+        self.paragraphs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip += 1
+        elif tag in BLOCK_TAGS:
+            self.paragraph()
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip = max(self.skip - 1, 0)
+        elif tag in BLOCK_TAGS:
+            self.paragraph()
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.text.append(data)
+
+    def paragraph(self):
+        """
+        Current paragraph is over
+        """
+        text = ''.join(self.text).strip()
+        if text:
+            self.paragraphs.append(text)
+        self.text = []
+
+    def pop(self):
+        """
+        Paragraphs parsed so far (removed from parser)
+        """
+        paragraphs, self.paragraphs = self.paragraphs, []
+        return paragraphs
+
+
+def countMarkup(stream, counter, contexts, block_size=64 * 1024):
+    """
+    Count words of markup (binary stream) into counter and contexts.
+    Stream is parsed block by block - whole file is never in memory.
+    """
+    parser = TextExtractor()
+    text = io.TextIOWrapper(stream, encoding='utf-8', errors='ignore')
+
+    def update(paragraphs):
+        for paragraph in paragraphs:
+            paragraph_counter, paragraph_contexts = countText(paragraph)
+            counter.update(paragraph_counter)
+            for word, context in paragraph_contexts.items():
+                contexts.setdefault(word, context)
+
+    for block in iter(lambda: text.read(block_size), ''):
+        parser.feed(block)
+        update(parser.pop())
+    parser.close()
+    parser.paragraph()
+    update(parser.pop())
+
+
+def bookParts(book):
+    """
+    Names of XHTML parts of EPUB (zip) in reading order (spine).
+    All XHTML/HTML parts if there is no spine.
+    """
+    names = book.namelist()
+
+    def tag(element):
+        # tag without namespace
+        return element.tag.rsplit('}', 1)[-1]
+
+    try:
+        container = ElementTree.fromstring(
+            book.read("META-INF/container.xml"))
+        rootfile = next(i for i in container.iter()
+                        if tag(i) == 'rootfile').get('full-path')
+        package = ElementTree.fromstring(book.read(rootfile))
+        base = posixpath.dirname(rootfile)
+        manifest = {i.get('id'): i.get('href')
+                    for i in package.iter() if tag(i) == 'item'}
+        spine = [posixpath.normpath(posixpath.join(
+                    base, unquote(manifest[i.get('idref')])))
+                 for i in package.iter() if tag(i) == 'itemref']
+        existing = set(names)
+        parts = [i for i in spine if i in existing]
+        if parts:
+            return parts
+    except (KeyError, StopIteration, TypeError, ElementTree.ParseError):
+        pass
+    return [i for i in names if i.lower().endswith(MARKUP_EXTENSIONS)]
+
+
+def countBook(path):
+    """
+    Count words of one book - EPUB or HTML file.
+    Parts of EPUB are read from zip as streams, nothing
+    is extracted to disk.
+    Runs in worker process.
+    """
+    counter = Counter()
+    contexts = {}
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as book:
+            for name in bookParts(book):
+                with book.open(name) as f:
+                    countMarkup(f, counter, contexts)
+    else:
+        with open(path, 'rb') as f:
+            countMarkup(f, counter, contexts)
+    return counter, contexts
 
 
 class Base(object):
@@ -33,33 +320,181 @@ class Base(object):
 
 class Kindle(Base):
     """
-    Handler of Kindle's database
+    Handler of Kindle's database.
+    Words are grouped by stem in database - one row per stem.
+    Source is either a path to vocab.db or a list of paths
+    (one per device). Databases are read in parallel and
+    merged into one list without duplicates.
+    Every database is read from its local snapshot - in cache_dir
+    or in memory, device itself is only read once.
     """
+    VOCAB_PATH = os.path.join("system", "vocabulary", "vocab.db")
 
-    def read(self, only_new_words=False):
+    def __init__(self, source, cache_dir=None, progress=None):
+        super(Kindle, self).__init__(source)
+        self.cache_dir = cache_dir
+        self.progress = progress
+
+    def connect(self, source):
+        """
+        Connection to the local snapshot of database.
+        """
+        target = ":memory:"
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            name = hashlib.sha1(
+                os.path.abspath(source).encode('utf-8')).hexdigest()
+            target = os.path.join(self.cache_dir, name + ".db")
+        def report(status, remaining, total):
+            if self.progress:
+                self.progress(source, total - remaining, total)
+        return snapshot(source, target, progress=report)
+
+    @staticmethod
+    def device(path):
+        """
+        Name of the device the database belongs to.
+        For <mount>/system/vocabulary/vocab.db - name of <mount>,
+        for any other location - path itself.
+        """
+        path = os.path.abspath(path)
+        if path.endswith(Kindle.VOCAB_PATH):
+            root = path[:-len(Kindle.VOCAB_PATH)].rstrip(os.sep)
+            return os.path.basename(root) or root
+        return path
+
+    def sources(self):
+        """
+        List of databases to read.
         """
-        Reading data from database.
+        if isinstance(self.source, (list, tuple)):
+            return list(self.source)
+        return [self.source]
+
+    def fetch(self, source, only_new_words=False):
+        """
+        Read words from a single database, grouped by stem and language:
+        (stem, language, context, lookups, first lookup, words, last lookup)
+        and ids of words (WORDS.id) for every (stem, language).
+        Context is the usage of the last lookup - taken by separate
+        query with the only MAX() aggregate, SQLite gives bare columns
+        of such query from the row of maximum. One row per group
+        is read by both queries, not every lookup.
+        Words of all languages are read - see validate.
         All words - category = 100.
         New words - category = 0.
         """
-        conn = sqlite3.connect(self.source)
-        command = None
-        if only_new_words:
-            command = "SELECT WORDS.stem, LOOKUPS.usage \
-                        FROM WORDS INNER JOIN LOOKUPS ON \
-                            WORDS.id = LOOKUPS.word_key \
-                                WHERE \
-                                    WORDS.lang = 'en' AND \
-                                        WORDS.category = 0"
-        else:
-            command = "SELECT WORDS.stem, LOOKUPS.usage \
-                        FROM WORDS INNER JOIN LOOKUPS ON \
-                            WORDS.id = LOOKUPS.word_key \
-                                WHERE \
-                                    WORDS.lang = 'en'"
-        for word, context in conn.execute(command):
-            self.data.append({'word': word, 'context': context})
-        conn.close()
+        conn = self.connect(source)
+        ids = {}
+        contexts = {}
+        where = " WHERE WORDS.category = 0" if only_new_words else ""
+        ids_command = "SELECT stem, lang, id FROM WORDS" + where
+        lookups = " FROM WORDS INNER JOIN LOOKUPS ON \
+                        WORDS.id = LOOKUPS.word_key" + where
+        context_command = "SELECT WORDS.stem, WORDS.lang, LOOKUPS.usage, \
+                        MAX(LOOKUPS.timestamp)" + \
+            lookups + " GROUP BY WORDS.stem, WORDS.lang"
+        command = "SELECT WORDS.stem, WORDS.lang, \
+                        COUNT(LOOKUPS.id), \
+                        MIN(LOOKUPS.timestamp), \
+                        COUNT(DISTINCT WORDS.word), \
+                        MAX(LOOKUPS.timestamp)" + \
+            lookups + " GROUP BY WORDS.stem, WORDS.lang"
+        try:
+            for stem, lang, word_id in conn.execute(ids_command):
+                ids.setdefault((stem, lang), []).append(word_id)
+            for stem, lang, usage, _ in conn.execute(context_command):
+                contexts[(stem, lang)] = usage
+            return [(stem, lang, contexts[(stem, lang)]) + tuple(rest)
+                    for stem, lang, *rest in conn.execute(command)], ids
+        finally:
+            conn.close()
+
+    def read(self, only_new_words=False):
+        """
+        Reading data from all databases.
+        Every word is kept once - with the context and
+        the device of its first occurrence, lookups of all devices
+        are summed up.
+        Also count words (self.total) and lookups (self.lookups).
+        Every row has ids of its words in every database:
+        {path: [WORDS.id]}
+        """
+        self.total = 0
+        self.lookups = 0
+        sources = self.sources()
+        with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+            results = executor.map(
+                lambda source: self.fetch(source, only_new_words), sources)
+            rows = {}
+            for source, (result, ids) in zip(sources, results):
+                device = self.device(source)
+                for word, lang, context, lookups, first, words, last \
+                        in result:
+                    self.total += words
+                    self.lookups += lookups
+                    key = (word, lang)
+                    row = rows.get(key)
+                    if row:
+                        row['lookups'] += lookups
+                        row['first'] = min(row['first'], first)
+                        row['last'] = max(row['last'], last)
+                        row['ids'][source] = ids[key]
+                        continue
+                    rows[key] = {'word': word,
+                                 'lang': lang,
+                                 'context': context,
+                                 'device': device,
+                                 'lookups': lookups,
+                                 'first': first,
+                                 'last': last,
+                                 'ids': {source: ids[key]}}
+            self.data.extend(rows.values())
+
+    @staticmethod
+    def markMastered(source, ids, progress=None):
+        """
+        Mark words with given ids as mastered (category = 100).
+        One transaction for all words.
+        """
+        conn = sqlite3.connect(source)
+        try:
+            with conn:
+                conn.executemany("UPDATE WORDS SET category = 100 \
+                                    WHERE id = ?", ((i,) for i in ids))
+        finally:
+            conn.close()
+        if progress:
+            progress(len(ids), len(ids))
+
+    @staticmethod
+    def truncate(source, ids, batch=500, progress=None):
+        """
+        Delete words with given ids and their lookups.
+        Every batch is a separate short transaction.
+        Free pages are reclaimed incrementally if database
+        allows it (auto_vacuum = INCREMENTAL), otherwise they are
+        left for reuse - no full VACUUM on device.
+        progress(done, total) is called after every batch.
+        """
+        conn = sqlite3.connect(source)
+        try:
+            for start in range(0, len(ids), batch):
+                chunk = ids[start:start + batch]
+                marks = ",".join("?" * len(chunk))
+                with conn:
+                    conn.execute("DELETE FROM LOOKUPS WHERE word_key IN "
+                                 "({})".format(marks), chunk)
+                    conn.execute("DELETE FROM WORDS WHERE id IN "
+                                 "({})".format(marks), chunk)
+                if progress:
+                    progress(start + len(chunk), len(ids))
+            auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            if auto_vacuum == 2:
+                # every step of pragma frees one page
+                conn.execute("PRAGMA incremental_vacuum").fetchall()
+        finally:
+            conn.close()
 
 
 class Text(Base):
@@ -72,11 +507,264 @@ class Text(Base):
         Proceed every line of file.
         One line - one word.
         """
-        with open(self.source, "r") as f:
+        with openText(self.source) as f:
             for line in f:
                 self.data.append({'word': line.rstrip('\n')})
 
 
+class Prose(Base):
+    """
+    Class for getting words from plain text - books, articles.
+    File is memory-mapped and split into chunks on sentence
+    boundaries, chunks are counted by a pool of processes.
+    Compressed file is decompressed in chunks instead.
+    """
+    CHUNK_SIZE = 4 * 1024 * 1024
+
+    def chunks(self):
+        """
+        Yield (start, end) byte offsets of chunks.
+        Every chunk ends right after the end of a sentence.
+        """
+        with open(self.source, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                start = 0
+                while start < size:
+                    end = start + self.CHUNK_SIZE
+                    if end < size:
+                        match = SENTENCE_END.search(m, end)
+                        end = match.end() if match else size
+                    else:
+                        end = size
+                    yield start, end
+                    start = end
+
+    def textChunks(self):
+        """
+        Yield chunks of decompressed text.
+        Every chunk ends right after the end of a sentence.
+        """
+        with openText(self.source) as f:
+            rest = ''
+            while True:
+                block = f.read(self.CHUNK_SIZE)
+                if not block:
+                    break
+                text = rest + block
+                end = max(text.rfind(i) for i in '.!?') + 1
+                if not end and len(text) > 4 * self.CHUNK_SIZE:
+                    # no sentences at all - cut on the last space
+                    end = text.rfind(' ') + 1 or len(text)
+                if end:
+                    yield text[:end]
+                rest = text[end:]
+            if rest:
+                yield rest
+
+    def countStream(self, executor, workers):
+        """
+        Count chunks of decompressed text.
+        Only a few chunks are in memory at the same time.
+        """
+        futures = deque()
+        for chunk in self.textChunks():
+            futures.append(executor.submit(countText, chunk))
+            if len(futures) > workers * 2:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+    def merge(self, results):
+        """
+        Merge counts of chunks in order of chunks.
+        The context of a word is its first sentence.
+        """
+        counter = Counter()
+        contexts = {}
+        for chunk_counter, chunk_contexts in results:
+            counter.update(chunk_counter)
+            for word, context in chunk_contexts.items():
+                contexts.setdefault(word, context)
+        for word, context in contexts.items():
+            self.data.append({'word': word,
+                              'context': context,
+                              'count': counter[word]})
+
+    def read(self):
+        """
+        Every unique word of text with its count and context.
+        """
+        if compression(self.source):
+            workers = os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                self.merge(self.countStream(executor, workers))
+            return
+        chunks = list(self.chunks())
+        if not chunks:
+            return
+        starts, ends = zip(*chunks)
+        with ProcessPoolExecutor() as executor:
+            self.merge(executor.map(countSlice,
+                                    repeat(self.source),
+                                    starts,
+                                    ends))
+
+
+class Book(Prose):
+    """
+    Class for getting words from e-books - EPUB or HTML.
+    Source is a book or a folder with books (library),
+    books are counted by a pool of processes.
+    """
+    EXTENSIONS = ('.epub',) + MARKUP_EXTENSIONS
+
+    @classmethod
+    def isBook(cls, path):
+        """
+        Path is a book or a library folder
+        """
+        return os.path.isdir(path) or path.lower().endswith(cls.EXTENSIONS)
+
+    def books(self):
+        """
+        Paths of books (all books of folder and its subfolders)
+        """
+        if not os.path.isdir(self.source):
+            yield self.source
+            return
+        for root, dirs, files in os.walk(self.source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(self.EXTENSIONS):
+                    yield os.path.join(root, name)
+
+    def read(self):
+        """
+        Every unique word of books with its count and context.
+        """
+        books = list(self.books())
+        if len(books) < 2:
+            self.merge(countBook(i) for i in books)
+            return
+        with ProcessPoolExecutor() as executor:
+            self.merge(executor.map(countBook, books))
+
+
+class Clippings(Base):
+    """
+    Class for getting words from Kindle's highlights.
+    Short highlights (words and phrases) - words, book - context.
+    File is only appended by Kindle, so the byte offset of the
+    end of parsed entries is saved with hash of the bytes
+    before it - next time only new entries are parsed.
+    """
+    CLIPPINGS_NAME = "My Clippings.txt"
+    STATE_FILE = os.path.join("src", "clippings.json")
+    SEPARATOR = b"=========="
+    # longer highlights are quotes, not words
+    MAX_WORDS = 3
+    # bytes before offset to check that file is the same
+    TAIL = 4096
+
+    def __init__(self, source, state_file=None):
+        super(Clippings, self).__init__(source)
+        self.state_file = state_file or self.STATE_FILE
+        self.offset = 0
+
+    @classmethod
+    def isClippings(cls, path):
+        """
+        Path is Kindle's clippings file
+        """
+        return os.path.basename(path) == cls.CLIPPINGS_NAME
+
+    def states(self):
+        """
+        Saved offsets of all clippings files
+        """
+        if not os.path.exists(self.state_file):
+            return {}
+        with open(self.state_file) as f:
+            return json.load(f)
+
+    def tail(self, f, offset):
+        """
+        Hash of bytes before offset
+        """
+        start = max(offset - self.TAIL, 0)
+        f.seek(start)
+        return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+    def start(self, f):
+        """
+        Offset to start from - saved one if the file
+        was only appended since then, 0 otherwise.
+        """
+        state = self.states().get(os.path.abspath(self.source))
+        if not state:
+            return 0
+        size = os.fstat(f.fileno()).st_size
+        if state['offset'] > size or \
+                self.tail(f, state['offset']) != state['hash']:
+            return 0
+        return state['offset']
+
+    def entries(self, f):
+        """
+        Yield (title, kind, text) of complete entries from current
+        position of file. self.offset - end of the last entry.
+        """
+        lines = []
+        for line in f:
+            if line.rstrip() != self.SEPARATOR:
+                lines.append(line.decode('utf-8-sig', errors='ignore'))
+                continue
+            self.offset = f.tell()
+            if len(lines) >= 2:
+                title = lines[0].strip()
+                kind = lines[1].strip()
+                text = ' '.join(i.strip() for i in lines[2:]).strip()
+                yield title, kind, text
+            lines = []
+
+    def read(self, only_new=True):
+        """
+        Words and phrases of short highlights.
+        only_new - only entries added after the last done().
+        """
+        seen = set()
+        with open(self.source, 'rb') as f:
+            self.offset = self.start(f) if only_new else 0
+            f.seek(self.offset)
+            for title, kind, text in self.entries(f):
+                # notes and bookmarks are not highlights
+                if 'Note' in kind or 'Bookmark' in kind:
+                    continue
+                words = WORD_PATTERN.findall(text)
+                if not words or len(words) > self.MAX_WORDS:
+                    continue
+                word = ' '.join(words).lower()
+                if word in seen:
+                    continue
+                seen.add(word)
+                self.data.append({'word': word, 'context': title})
+
+    def done(self):
+        """
+        Words are exported - remember where to start next time
+        """
+        states = self.states()
+        with open(self.source, 'rb') as f:
+            states[os.path.abspath(self.source)] = {
+                'offset': self.offset,
+                'hash': self.tail(f, self.offset)}
+        with open(self.state_file, 'w') as f:
+            json.dump(states, f)
+
+
 class Input(Base):
     """
     Class for getting word from input.
@@ -0,0 +1,84 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+===Description===
+Module for local history of exported words.
+Words which are known to be in Lingualeo dictionary
+are skipped without asking Lingualeo again.
+"""
+
+import os
+import time
+import sqlite3
+
+
+class History(object):
+    """
+    SQLite history of exported words.
+    One row per word (unique index).
+    """
+    HISTORY_FILE = os.path.join("src", "history.db")
+
+    def __init__(self, path=None):
+        """
+        Open (create if needed) history database
+        """
+        self.path = path or self.HISTORY_FILE
+        self.conn = sqlite3.connect(self.path)
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS HISTORY
+                (word TEXT NOT NULL,
+                    tword TEXT,
+                    context TEXT,
+                    result TEXT,
+                    timestamp INTEGER,
+                    source TEXT);
+                """)
+            self.conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS HISTORY_WORD
+                    ON HISTORY (word);
+                """)
+
+    def known(self, results):
+        """
+        Set of words exported with one of given results.
+        """
+        results = list(results)
+        command = "SELECT word FROM HISTORY WHERE result IN ({})".format(
+            ",".join("?" * len(results)))
+        return {word for word, in self.conn.execute(command, results)}
+
+    def translations(self):
+        """
+        Dictionary word - translation of words with translation.
+        """
+        return dict(self.conn.execute(
+            "SELECT word, tword FROM HISTORY WHERE tword != ''"))
+
+    def add(self, rows, source=""):
+        """
+        Save rows of export:
+        {"word": word,
+         "result": result,
+         "tword": translate,
+         "context": context}
+        """
+        timestamp = int(time.time())
+        with self.conn:
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO HISTORY VALUES
+                    (:word, :tword, :context, :result, :timestamp, :source)
+                """, ({"word": row['word'],
+                       "tword": row.get('tword', ''),
+                       "context": row.get('context', ''),
+                       "result": row['result'],
+                       "timestamp": timestamp,
+                       "source": row.get('device', source)}
+                      for row in rows))
+
+    def close(self):
+        """
+        Close history database
+        """
+        self.conn.close()
@@ -0,0 +1,134 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+===Description===
+Module for offline export.
+Words which can't be exported (no connection) are kept
+in local queue and exported when Lingualeo is reachable.
+"""
+
+import os
+import time
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from requests.exceptions import ConnectionError as NoConnection, Timeout
+
+from service import Lingualeo, RESULTS, exportWord
+
+# words exported at once
+BATCH = 20
+# simultaneous requests to Lingualeo
+WORKERS = 4
+
+
+class Outbox(object):
+    """
+    SQLite queue of words waiting for export.
+    One row per word (unique index), first queued - first exported.
+    """
+    OUTBOX_FILE = os.path.join("src", "outbox.db")
+
+    def __init__(self, path=None):
+        """
+        Open (create if needed) outbox database
+        """
+        self.path = path or self.OUTBOX_FILE
+        self.conn = sqlite3.connect(self.path)
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS OUTBOX
+                (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    word TEXT NOT NULL,
+                    context TEXT,
+                    timestamp INTEGER,
+                    source TEXT);
+                """)
+            self.conn.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS OUTBOX_WORD
+                    ON OUTBOX (word);
+                """)
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM OUTBOX").fetchone()[0]
+
+    def put(self, rows, source=""):
+        """
+        Queue rows {"word": word, "context": context}.
+        Already queued words are not queued again.
+        """
+        timestamp = int(time.time())
+        with self.conn:
+            self.conn.executemany("""
+                INSERT OR IGNORE INTO OUTBOX (word, context, timestamp, source)
+                    VALUES (:word, :context, :timestamp, :source)
+                """, ({"word": row['word'].lower(),
+                       "context": row.get('context', ''),
+                       "timestamp": timestamp,
+                       "source": row.get('device', source)}
+                      for row in rows))
+
+    def peek(self, count):
+        """
+        First 'count' queued rows (not removed)
+        """
+        return [{"id": i, "word": word, "context": context, "device": source}
+                for i, word, context, source in self.conn.execute(
+                    "SELECT id, word, context, source FROM OUTBOX "
+                    "ORDER BY id LIMIT ?", (count,))]
+
+    def remove(self, ids):
+        """
+        Remove exported rows
+        """
+        with self.conn:
+            self.conn.executemany("DELETE FROM OUTBOX WHERE id = ?",
+                                  ((i,) for i in ids))
+
+    def close(self):
+        """
+        Close outbox database
+        """
+        self.conn.close()
+
+
+def flush(outbox, lingualeo, batch=BATCH, workers=WORKERS,
+          progress=None, stopped=None):
+    """
+    Export queued words in batches, words of batch are
+    exported by 'workers' threads.
+    Exported words are removed from outbox, the rest stay
+    if connection is lost or meatballs are over.
+    'progress' gets rows of every batch.
+    Return rows of export.
+    """
+    done = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while not (stopped and stopped.is_set()):
+            size = batch
+            if not lingualeo.premium:
+                size = min(size, lingualeo.meatballs - Lingualeo.NO_MEATBALLS)
+            rows = outbox.peek(size) if size > 0 else []
+            if not rows:
+                break
+            futures = [executor.submit(exportWord, lingualeo, i)
+                       for i in rows]
+            ids, exported, lost = [], [], False
+            for row, future in zip(rows, futures):
+                try:
+                    result = future.result()
+                except (NoConnection, Timeout):
+                    lost = True
+                    continue
+                result['device'] = row['device']
+                ids.append(row['id'])
+                exported.append(result)
+            outbox.remove(ids)
+            if not lingualeo.premium:
+                lingualeo.meatballs -= sum(1 for i in exported
+                                           if i['result'] == RESULTS['ad'])
+            done.extend(exported)
+            if progress:
+                progress(exported)
+            if lost:
+                break
+    return done
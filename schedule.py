@@ -0,0 +1,48 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+===Description===
+Module for ordering words before export.
+When meatballs are fewer than words, the most valuable
+words should be uploaded first.
+"""
+
+import time
+import heapq
+
+# lookups lose half of their value in this period
+HALF_LIFE = 30 * 24 * 60 * 60
+
+
+def score(row, now=None):
+    """
+    Value of word:
+    -how many times it was looked up (or met in text).
+    -how recently it was looked up (Kindle time - milliseconds).
+    """
+    now = now or time.time()
+    hits = row.get('lookups', 0) + row.get('count', 0) or 1
+    last = row.get('last')
+    if not last:
+        return hits
+    age = max(now - last / 1000, 0)
+    return hits * 0.5 ** (age / HALF_LIFE)
+
+
+def prioritize(array, budget, now=None):
+    """
+    Put 'budget' most valuable words first (found by heap),
+    the rest are ordered by value too - they go first
+    when meatballs are refilled.
+    Words of equal value keep their order.
+    Words which cost nothing (known from history) should
+    be removed before - they would take the budget.
+    """
+    now = now or time.time()
+    keys = [(score(row, now), -index) for index, row in enumerate(array)]
+    top = heapq.nlargest(max(budget, 0), range(len(array)),
+                         key=keys.__getitem__)
+    chosen = set(top)
+    rest = sorted((i for i in range(len(array)) if i not in chosen),
+                  key=keys.__getitem__, reverse=True)
+    return [array[i] for i in top + rest]
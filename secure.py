@@ -0,0 +1,47 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+===Description===
+Module for keeping secrets (session of Lingualeo) in keyring
+of operating system - Windows Credential Locker, macOS Keychain,
+Secret Service on Linux (package 'keyring').
+Nothing is saved if there is no keyring.
+"""
+
+try:
+    import keyring
+    from keyring.errors import KeyringError
+except ImportError:
+    keyring = None
+
+    class KeyringError(Exception):
+        pass
+
+SERVICE = "Kindleo"
+# no keyring backend - RuntimeError
+ERRORS = (KeyringError, RuntimeError)
+
+
+def save(name, secret):
+    """
+    Save secret, return False if it can't be saved
+    """
+    if keyring is None:
+        return False
+    try:
+        keyring.set_password(SERVICE, name, secret)
+    except ERRORS:
+        return False
+    return True
+
+
+def load(name):
+    """
+    Secret saved by save or None
+    """
+    if keyring is None:
+        return None
+    try:
+        return keyring.get_password(SERVICE, name)
+    except ERRORS:
+        return None
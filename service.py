@@ -5,19 +5,39 @@
 Module for configuring Lingualeo API
 """
 
+import os
+import json
+import hmac
+import hashlib
 import requests
 from requests.exceptions import ConnectionError as NoConnection, Timeout
 from operator import itemgetter
 from collections import Counter
 
+# results of export of word
+RESULTS = {'ad': "added",
+           'no_ad': "not added",
+           'no_tr': "no translation",
+           'ex': "exists",
+           'sk': "skipped",
+           'qu': "queued",
+           'co': "too common",
+           'rj': "rejected"}
+# results that mean - word is in Lingualeo dictionary
+KNOWN = (RESULTS['ad'], RESULTS['ex'])
+
 
 class Lingualeo(object):
     """Lingualeo.com API class"""
     TIMEOUT = 5
     LOGIN = "http://api.lingualeo.com/api/login"
+    IS_AUTHORIZED = "http://api.lingualeo.com/isauthorized"
     ADD_WORD = "http://api.lingualeo.com/addword"
     ADD_WORD_MULTI = "http://api.lingualeo.com/addwords"
     GET_TRANSLATE = "http://api.lingualeo.com/gettranslates?word="
+    AVATAR_CACHE = os.path.join("src", "cache", "avatars")
+    # iterations of password hash of saved session
+    HASH_ROUNDS = 100000
     # added for test purposes
     NO_MEATBALLS = 0
     PREMIUM = 0
@@ -50,11 +70,53 @@ class Lingualeo(object):
             self.meatballs = self.auth_info['meatballs']
         else:
             self.meatballs = "∞"
+        # avatar is loaded separately - see loadAvatar
+        self.avatar = None
+
+    def loadAvatar(self, cache_dir=None):
+        """
+        Get avatar of user.
+        Avatar is cached on disk by its url and revalidated
+        by server (ETag/Last-Modified) - unchanged avatar
+        is not downloaded again.
+        Return avatar or None.
+        """
+        url = self.auth_info['avatar_mini']
+        cache_dir = cache_dir or self.AVATAR_CACHE
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        data_file = os.path.join(cache_dir, name)
+        meta_file = data_file + ".json"
+        cached = None
+        headers = {}
+        if os.path.exists(data_file) and os.path.exists(meta_file):
+            with open(data_file, 'rb') as f:
+                cached = f.read()
+            with open(meta_file) as f:
+                meta = json.load(f)
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
         try:
-            self.avatar = requests.get(self.auth_info['avatar_mini'],
-                                       timeout=self.TIMEOUT).content
+            response = requests.get(url,
+                                    headers=headers,
+                                    timeout=self.TIMEOUT)
         except (NoConnection, Timeout):
-            self.avatar = None
+            self.avatar = cached
+            return self.avatar
+        if response.status_code == 200:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(data_file, 'wb') as f:
+                f.write(response.content)
+            with open(meta_file, 'w') as f:
+                json.dump({'etag': response.headers.get('ETag'),
+                           'last_modified':
+                               response.headers.get('Last-Modified')}, f)
+            self.avatar = response.content
+        else:
+            # 304 - not modified
+            self.avatar = cached
+        return self.avatar
 
     def auth(self):
         """
@@ -69,6 +131,86 @@ class Lingualeo(object):
         self.cookies = r.cookies
         self.auth_info = r.json()['user']
 
+    def user(self):
+        """
+        Name of saved session - email.
+        Password is not a part of it - names of keyring
+        entries are not encrypted.
+        """
+        return self.email
+
+    def passwordHash(self, salt):
+        """
+        Salted hash of password - session is reused
+        only with the same password
+        """
+        return hashlib.pbkdf2_hmac('sha256',
+                                   self.password.encode('utf-8'),
+                                   bytes.fromhex(salt),
+                                   self.HASH_ROUNDS).hex()
+
+    def exportSession(self):
+        """
+        Session (only cookies) as json.
+        Info about user is not saved - it is loaded again
+        when session is reused (see isSessionValid).
+        """
+        salt = os.urandom(16).hex()
+        return json.dumps({
+            "user": self.user(),
+            "salt": salt,
+            "password": self.passwordHash(salt),
+            "cookies": requests.utils.dict_from_cookiejar(self.cookies)
+        })
+
+    def restoreSession(self, session):
+        """
+        Restore cookies saved by exportSession.
+        Return False if session is of another user (password)
+        or broken.
+        """
+        try:
+            session = json.loads(session)
+            if session['user'] != self.user() or \
+                    not hmac.compare_digest(
+                        session['password'],
+                        self.passwordHash(session['salt'])):
+                return False
+            self.cookies = requests.utils.cookiejar_from_dict(
+                session['cookies'])
+        except (ValueError, KeyError, TypeError):
+            return False
+        self.auth_info = None
+        return True
+
+    def isSessionValid(self):
+        """
+        Check if cookies are still valid - one cheap request
+        instead of login.
+        Fresh info about user (meatballs) is taken from response
+        if it is there, otherwise auth_info is None.
+        """
+        response = requests.get(self.IS_AUTHORIZED,
+                                cookies=self.cookies,
+                                timeout=self.TIMEOUT)
+        try:
+            data = response.json()
+            valid = bool(data['is_authorized'])
+        except (ValueError, KeyError, TypeError):
+            return False
+        self.auth_info = data.get('user') if valid else None
+        return valid
+
+    def isReachable(self):
+        """
+        Check if Lingualeo answers (no login needed)
+        """
+        try:
+            requests.head(self.IS_AUTHORIZED, timeout=self.TIMEOUT)
+        except (NoConnection, Timeout):
+            return False
+        return True
+
     def get_translate(self, word):
         """
         Get translation from lingualeo's API
@@ -147,3 +289,32 @@ class Lingualeo(object):
             return False
         else:
             return True
+
+
+def exportWord(lingualeo, row):
+    """
+    Export one word to Lingualeo.
+    Return row of export:
+    {"word": word,
+     "result": result,
+     "tword": translate,
+     "context": context}
+    Meatballs are not counted here - caller does it.
+    """
+    word = row['word'].lower()
+    context = row.get('context', '')
+    response = lingualeo.get_translate(word)
+    translate = response['tword']
+    if response['is_exist']:
+        result = RESULTS['ex']
+    elif translate == '':
+        result = RESULTS['no_tr']
+    else:
+        is_new = lingualeo.add_word(word,
+                                    translate,
+                                    context).json()['is_new']
+        result = RESULTS['ad'] if is_new else RESULTS['no_tr']
+    return {"word": word,
+            "result": result,
+            "tword": translate,
+            "context": context}
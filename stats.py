@@ -0,0 +1,91 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+===Description===
+Module for statistics of export.
+Rows are grouped by result while they come, so counts are
+known at any moment and rows are sorted by result without sorting.
+"""
+
+from collections import Counter
+
+
+class Statistics(object):
+    """
+    Rows of export grouped by result:
+    {"word": word,
+     "result": result,
+     "tword": translate,
+     "context": context}
+    Words which weren't processed (e.g. meatballs are over)
+    are kept as range of array - rows are made only when needed.
+    """
+
+    def __init__(self, rows=None):
+        # result - rows in order of adding
+        self.groups = {}
+        # result - ranges (array, start, end)
+        self.ranges = {}
+        self.counts = Counter()
+        self.total = 0
+        if rows:
+            self.addMany(rows)
+
+    def __len__(self):
+        return self.total
+
+    def __iter__(self):
+        return self.rows()
+
+    def add(self, row):
+        """
+        Add one row
+        """
+        result = row['result']
+        self.groups.setdefault(result, []).append(row)
+        self.counts[result] += 1
+        self.total += 1
+
+    def addMany(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def addRange(self, result, array, start=0, end=None):
+        """
+        Words array[start:end] got the same result.
+        Rows are not made here - time doesn't depend on count.
+        """
+        end = len(array) if end is None else end
+        if end <= start:
+            return
+        self.ranges.setdefault(result, []).append((array, start, end))
+        self.counts[result] += end - start
+        self.total += end - start
+
+    @staticmethod
+    def rangeRows(result, array, start, end):
+        for i in range(start, end):
+            yield {"word": array[i]['word'],
+                   "result": result,
+                   "tword": "",
+                   "context": array[i].get('context', '')}
+
+    def rows(self, results=None):
+        """
+        Rows sorted by result (rows of the same result -
+        in order of adding), only given results if any
+        """
+        for result in sorted(set(self.groups) | set(self.ranges)):
+            if results is not None and result not in results:
+                continue
+            for row in self.groups.get(result, []):
+                yield row
+            for array, start, end in self.ranges.get(result, []):
+                for row in self.rangeRows(result, array, start, end):
+                    yield row
+
+    def count(self, result):
+        """
+        Count of words with result
+        """
+        return self.counts[result]
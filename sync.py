@@ -0,0 +1,265 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+===Description===
+Module for automatic export from Kindle without GUI.
+Mount points are polled for Kindle's vocab.db, export
+starts only when the database is changed.
+Words from local history are not exported again.
+Password is taken from settings saved by GUI (src/src.ini)
+or asked - it is not passed in command line.
+
+===Usage===
+python sync.py [email]
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import string
+import sqlite3
+import getpass
+import argparse
+import configparser
+from requests.exceptions import ConnectionError as NoConnection, Timeout
+
+from handler import Kindle
+from service import Lingualeo, RESULTS, KNOWN, exportWord
+from history import History
+from validate import validate
+from words import Lemmatizer, removeDuplicates
+from log_conf import setLogger
+
+# settings of GUI - saved email/password
+SETTINGS_FILE = os.path.join("src", "src.ini")
+
+
+def mountRoots():
+    """
+    Places where Kindle can be mounted.
+    Windows - drives, others - folders with mounted devices.
+    """
+    if os.name == 'nt':
+        return ["{}:\\".format(i) for i in string.ascii_uppercase]
+    user = getpass.getuser()
+    return [os.path.join("/media", user),
+            os.path.join("/run", "media", user),
+            "/media",
+            "/mnt",
+            "/Volumes"]
+
+
+def findKindles(roots=None):
+    """
+    Paths to vocab.db of every mounted Kindle.
+    Only roots and their first level are checked.
+    """
+    found = []
+    for root in roots or mountRoots():
+        if not os.path.isdir(root):
+            continue
+        candidates = [root]
+        if os.name != 'nt':
+            try:
+                candidates += [os.path.join(root, i)
+                               for i in os.listdir(root)]
+            except OSError:
+                pass
+        for i in candidates:
+            path = os.path.join(i, Kindle.VOCAB_PATH)
+            if os.path.isfile(path) and path not in found:
+                found.append(path)
+    return found
+
+
+def firstPage(path):
+    """
+    Checksum of the first page of SQLite database.
+    The page has change counter of database,
+    so every committed change gives new checksum.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(100)
+        if len(header) < 100:
+            return zlib.crc32(header)
+        page_size = int.from_bytes(header[16:18], 'big')
+        # 1 means 65536
+        if page_size == 1:
+            page_size = 65536
+        return zlib.crc32(header + f.read(page_size - 100))
+
+
+class Watcher(object):
+    """
+    Detects changed Kindle databases.
+    Fingerprint of database - size, mtime and
+    checksum of the first page. Checksum is calculated
+    only when size or mtime changed.
+    """
+    STATE_FILE = os.path.join("src", "sync.json")
+
+    def __init__(self, roots=None, state_file=None):
+        self.roots = roots
+        self.state_file = state_file or self.STATE_FILE
+        self.fingerprints = {}
+        if os.path.exists(self.state_file):
+            with open(self.state_file) as f:
+                self.fingerprints = json.load(f)
+
+    def save(self):
+        """
+        Save fingerprints of exported databases
+        """
+        with open(self.state_file, 'w') as f:
+            json.dump(self.fingerprints, f)
+
+    def fingerprint(self, path):
+        """
+        [size, mtime, checksum] of database.
+        Old checksum is reused if size and mtime are the same.
+        """
+        stat = os.stat(path)
+        old = self.fingerprints.get(path)
+        if old and old[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return old
+        return [stat.st_size, stat.st_mtime_ns, firstPage(path)]
+
+    def changed(self):
+        """
+        Dictionary path - fingerprint of new or changed databases.
+        """
+        result = {}
+        for path in findKindles(self.roots):
+            try:
+                fingerprint = self.fingerprint(path)
+            except OSError:
+                # Kindle was unmounted
+                continue
+            if fingerprint != self.fingerprints.get(path):
+                result[path] = fingerprint
+        return result
+
+    def done(self, changed):
+        """
+        Databases are exported - remember their fingerprints
+        """
+        self.fingerprints.update(changed)
+        self.save()
+
+
+def prepare(rows, lemmatizer):
+    """
+    Valid words normalized to lemmas, without duplicates -
+    the same as GUI does before export
+    """
+    valid, _ = validate(rows)
+    lemmatizer.normalize(valid)
+    return removeDuplicates(valid)
+
+
+def export(path, lingualeo, history, lemmatizer, logger):
+    """
+    Export words of Kindle database which are not
+    in local history yet. Stop when meatballs are over.
+    Return False if not all words are exported.
+    """
+    handler = Kindle([path])
+    handler.read()
+    known = history.known(KNOWN)
+    rows = [i for i in prepare(handler.get(), lemmatizer)
+            if i['word'].lower() not in known]
+    logger.debug("%i new words of %i", len(rows), len(handler.get()))
+    for row in rows:
+        if lingualeo.meatballs == Lingualeo.NO_MEATBALLS:
+            logger.debug("0 meatballs. Sync stopped")
+            return False
+        exported = exportWord(lingualeo, row)
+        if exported['result'] == RESULTS['ad'] and not lingualeo.premium:
+            lingualeo.meatballs -= 1
+        exported['device'] = row['device']
+        history.add([exported])
+    return True
+
+
+def run(email, password, interval=10, roots=None):
+    """
+    Poll for changed databases every 'interval' seconds.
+    Database is remembered as exported only when all its
+    words are exported. Broken database is skipped until
+    it is changed.
+    """
+    logger = setLogger(name='sync')
+    watcher = Watcher(roots)
+    history = History()
+    lemmatizer = Lemmatizer()
+    # path - fingerprint of databases which can't be read
+    broken = {}
+    logger.debug("Sync started")
+    while True:
+        changed = {path: fingerprint
+                   for path, fingerprint in watcher.changed().items()
+                   if broken.get(path) != fingerprint}
+        if changed:
+            logger.debug("Changed: %s", ", ".join(changed))
+            lingualeo = Lingualeo(email, password)
+            try:
+                lingualeo.auth()
+                lingualeo.initUser()
+                for path, fingerprint in changed.items():
+                    try:
+                        done = export(path, lingualeo, history,
+                                      lemmatizer, logger)
+                    except (NoConnection, Timeout):
+                        raise
+                    # requests errors are OSError too - they are above
+                    except (sqlite3.DatabaseError, OSError) as e:
+                        logger.debug("%s is skipped - %s", path, e)
+                        broken[path] = fingerprint
+                        continue
+                    if done:
+                        watcher.done({path: fingerprint})
+            except (NoConnection, Timeout):
+                logger.debug("No connection. Will try again")
+            except KeyError:
+                logger.debug("Email or password are incorrect")
+                sys.exit(1)
+        time.sleep(interval)
+
+
+def savedCredentials(path=SETTINGS_FILE):
+    """
+    Email and password saved by GUI or empty strings
+    """
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        parser.read(path, encoding='utf-8')
+    except configparser.Error:
+        return "", ""
+    if not parser.has_section('General'):
+        return "", ""
+    # QSettings quotes values with special characters
+    return tuple(parser.get('General', i, fallback='').strip('"')
+                 for i in ("email", "password"))
+
+
+def main():
+    # parser of commandline arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("email", nargs='?',
+                        help="saved email (src/src.ini) if not given")
+    parser.add_argument("--interval", type=int, default=10)
+    args = parser.parse_args()
+    saved_email, saved_password = savedCredentials()
+    email = args.email or saved_email
+    if not email:
+        parser.error("email is not given and not saved")
+    if email == saved_email and saved_password:
+        password = saved_password
+    else:
+        password = getpass.getpass("Lingualeo password: ")
+    run(email, password, args.interval)
+
+if __name__ == "__main__":
+    main()
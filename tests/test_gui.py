@@ -7,7 +7,7 @@ Module for tests
 
 Recommended to run with nosetests as:
 nosetests --exe --with-coverage --cover-erase --cover-html
---cover-package=gui_export.py,service.py,handler.py
+--cover-package=gui_export.py,service.py,handler.py,history.py,sync.py,words.py,schedule.py,secure.py,outbox.py,validate.py,writer.py,anki.py,fanout.py,dictionary.py,stats.py
 
 E731 - use def instead of lambda. To the hell it.
 """
@@ -22,13 +22,20 @@ from PyQt4 import QtGui, QtCore
 from gui_export import MainWindow, ExportDialog, StatisticsDialog,\
                        AboutDialog, NotificationDialog, ExceptionDialog,\
                        Results, QuitSure
-from handler import Kindle
+from handler import Kindle, Clippings
 from service import Lingualeo
+from outbox import Outbox
+from history import History
 
 TEST_DB = 'test.db'
 REPAIR_DB = 'test2.db'
 TEST_TXT = 'test.txt'
 TEST_SRC = 'test.ini'
+TEST_OUTBOX = 'test_outbox.db'
+TEST_HISTORY = 'test_history.db'
+TEST_WORDS = 'test_words.csv'
+TEST_CLIPPINGS = 'My Clippings.txt'
+TEST_STATE = 'test_clippings.json'
 
 
 def leftMouseClick(widget):
@@ -213,20 +220,54 @@ class TestMainWindow(BaseTest):
         Turn off logger
         Set english language
         Set credentials from json file
+        History and outbox - test files
         """
         super(TestMainWindow, self).setUp()
         logging.disable(logging.CRITICAL)
+        self.files = History.HISTORY_FILE, Outbox.OUTBOX_FILE
+        History.HISTORY_FILE = TEST_HISTORY
+        Outbox.OUTBOX_FILE = TEST_OUTBOX
         self.ui = MainWindow()
         self.ui.language = 'en'
         self.ui.loadTranslation()
         self.ui.email_edit.setText('b346059@trbvn.com')
         self.ui.pass_edit.setText('1234567890')
+        # login of saved user (loadDefaults) is not used
+        self.ui.auth_timer.stop()
+        self.ui.auth_task.wait()
+        self.ui.auth_task.setVariables("", "")
+
+    def login(self):
+        """
+        Login in background and wait for it
+        """
+        self.ui.startAuth()
+        self.ui.auth_task.wait()
+        self.app.processEvents()
+
+    def clickExport(self):
+        """
+        Click Export and wait for login in background -
+        export continues when it is finished
+        """
+        leftMouseClick(self.ui.export_button)
+        self.ui.auth_task.wait()
+        self.app.processEvents()
 
     def tearDown(self):
         """
         Prevent gtk-Critical messages
         Remove test.db in case if it's present
-        """
+        Remove test history and outbox
+        """
+        self.ui.auth_task.wait()
+        self.ui.outbox_task.stop()
+        self.ui.outbox_task.wait()
+        self.ui.dialog.history.close()
+        History.HISTORY_FILE, Outbox.OUTBOX_FILE = self.files
+        for i in (TEST_HISTORY, TEST_OUTBOX):
+            if os.path.exists(i):
+                os.remove(i)
         super(TestMainWindow, self).tearDown()
         if Lingualeo.PREMIUM != 0:
             Lingualeo.PREMIUM = 0
@@ -281,7 +322,7 @@ class TestMainWindow(BaseTest):
         self.ui.email_edit.setText("")
         self.ui.pass_edit.setText("")
         self.ui.input_word_edit.setText("test")
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
         self.assertEqual(self.ui.status_bar.currentMessage(),
                          "Email or password are incorrect")
 
@@ -289,7 +330,7 @@ class TestMainWindow(BaseTest):
         """
         No word in input - show an error in statusbar.
         """
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
         self.assertEqual(self.ui.status_bar.currentMessage(),
                          "No input")
 
@@ -298,7 +339,7 @@ class TestMainWindow(BaseTest):
         No text file is selected - show an error in statusbar.
         """
         self.ui.text_radio.setChecked(True)
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
         self.assertEqual(self.ui.status_bar.currentMessage(),
                          "No txt file")
 
@@ -308,7 +349,7 @@ class TestMainWindow(BaseTest):
         """
         self.ui.text_radio.setChecked(True)
         self.ui.text_path.setText(TEST_DB)
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
         self.assertEqual(self.ui.status_bar.currentMessage(), "Not txt file")
 
     def test_text_empty_file_not_run(self):
@@ -318,7 +359,7 @@ class TestMainWindow(BaseTest):
         createTxtFile(empty=True)
         self.ui.text_radio.setChecked(True)
         self.ui.text_path.setText(TEST_TXT)
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
         self.assertEqual(self.ui.status_bar.currentMessage(),
                          "Txt file is empty")
 
@@ -327,7 +368,7 @@ class TestMainWindow(BaseTest):
         No Kindle database is selected - show an error in statusbar.
         """
         self.ui.kindle_radio.setChecked(True)
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
         self.assertEqual(self.ui.status_bar.currentMessage(),
                          "No Kindle database")
 
@@ -337,7 +378,7 @@ class TestMainWindow(BaseTest):
         """
         self.ui.kindle_radio.setChecked(True)
         self.ui.kindle_path.setText(TEST_TXT)
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
         self.assertEqual(self.ui.status_bar.currentMessage(),
                          "Not database")
 
@@ -348,7 +389,7 @@ class TestMainWindow(BaseTest):
         createSqlBase(valid=False)
         self.ui.kindle_radio.setChecked(True)
         self.ui.kindle_path.setText(TEST_DB)
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
         self.assertEqual(self.ui.status_bar.currentMessage(),
                          "Not valid database")
 
@@ -359,7 +400,7 @@ class TestMainWindow(BaseTest):
         createSqlBase()
         self.ui.kindle_radio.setChecked(True)
         self.ui.kindle_path.setText(TEST_DB)
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
         self.assertEqual(self.ui.status_bar.currentMessage(),
                          "Kindle database is empty")
 
@@ -371,7 +412,28 @@ class TestMainWindow(BaseTest):
         createSqlBase(malformed=True, array=array, new=3)
         self.ui.kindle_radio.setChecked(True)
         self.ui.kindle_path.setText(TEST_DB)
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
+        self.assertEqual(self.ui.kindle_repair_button.isHidden(), False)
+        self.assertEqual(self.ui.status_bar.currentMessage(),
+                         "Database is malformed. Click 'Repair'")
+
+    def test_kindle_malformed_inside_not_run(self):
+        """
+        Kindle database is broken after the first pages -
+        show 'Repair' instead of failing on reading.
+        """
+        createSqlBase()
+        with sqlite3.connect(TEST_DB) as conn:
+            conn.executemany("INSERT INTO WORDS (id, word, stem, lang) "
+                             "VALUES (?, ?, ?, 'en')",
+                             (('en:w{}'.format(i), 'w', 'w')
+                              for i in range(3000)))
+        with open(TEST_DB, 'r+b') as f:
+            f.seek(4096 * 9)
+            f.write(b'\xff' * 4096)
+        self.ui.kindle_radio.setChecked(True)
+        self.ui.kindle_path.setText(TEST_DB)
+        self.clickExport()
         self.assertEqual(self.ui.kindle_repair_button.isHidden(), False)
         self.assertEqual(self.ui.status_bar.currentMessage(),
                          "Database is malformed. Click 'Repair'")
@@ -386,7 +448,7 @@ class TestMainWindow(BaseTest):
         self.ui.kindle_radio.setChecked(True)
         self.ui.kindle_path.setText(TEST_DB)
         self.ui.file_name = TEST_DB
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
         timer = createClickTimer(self.ui.notif)
         timer.start(10)
         leftMouseClick(self.ui.kindle_repair_button)
@@ -428,14 +490,21 @@ class TestMainWindow(BaseTest):
 
     def test_lingualeo_no_connection(self):
         """
-        No connection - statusbar shows an error
+        No connection - words are queued, statusbar shows it
         """
         timeout = Lingualeo.TIMEOUT
         Lingualeo.TIMEOUT = 0.01
         self.ui.input_word_edit.setText("test")
-        leftMouseClick(self.ui.export_button)
-        self.assertEqual(self.ui.status_bar.currentMessage(), "No connection")
+        self.clickExport()
+        self.ui.outbox_task.stop()
+        self.ui.outbox_task.wait()
+        outbox = Outbox()
+        queued = outbox.peek(10)
+        outbox.close()
         Lingualeo.TIMEOUT = timeout
+        self.assertEqual(self.ui.status_bar.currentMessage(),
+                         "No connection. 1 words are queued for export")
+        self.assertEqual([i['word'] for i in queued], ['test'])
 
     def test_lingualeo_no_meatballs(self):
         """
@@ -444,7 +513,7 @@ class TestMainWindow(BaseTest):
         self.ui.input_word_edit.setText("test")
         # we use 200 as zero just for test
         Lingualeo.NO_MEATBALLS = 200
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
         self.assertEqual(self.ui.status_bar.currentMessage(), "No meatballs")
 
     def test_russian_translation(self):
@@ -507,6 +576,24 @@ class TestMainWindow(BaseTest):
         self.assertEqual("<a href='mailto:GriefMontana@gmail.com'>Send E-mail</a>",
                          self.ui.about.email_label.text())
 
+    def test_save_word_list(self):
+        """
+        Word list is saved without Lingualeo, duplicates removed
+        """
+        createTxtFile(array=['test', 'test', 'watched'])
+        self.ui.text_radio.setChecked(True)
+        self.ui.file_name = TEST_TXT
+        dialog = QtGui.QFileDialog.getSaveFileName
+        QtGui.QFileDialog.getSaveFileName = lambda **kwargs: TEST_WORDS
+        try:
+            self.ui.save_words_action.trigger()
+        finally:
+            QtGui.QFileDialog.getSaveFileName = dialog
+        with open(TEST_WORDS) as f:
+            words = [i.split(',')[0] for i in f.read().split()]
+        os.remove(TEST_WORDS)
+        self.assertEqual(words, ['word', 'test', 'watch'])
+
 
 class TestExportDialog(TestMainWindow):
     """
@@ -541,11 +628,12 @@ class TestExportDialog(TestMainWindow):
         self.ui.kindle_radio.setChecked(True)
         self.ui.file_name = TEST_DB
         Lingualeo.PREMIUM = 1
+        self.login()
         timer_1 = createClickTimer(self.ui.dialog)
         timer_2 = createClickTimer(self.ui.dialog.stat_window)
         timer_1.start(10)
         timer_2.start(12)
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
         self.assertEqual("∞", self.ui.dialog.meatballs_value_label.text())
 
     def test_good_input_export_run(self):
@@ -553,11 +641,12 @@ class TestExportDialog(TestMainWindow):
         Word 'test' passed to Input - ExportDialog is shown
         """
         self.ui.input_word_edit.setText('test')
+        self.login()
         timer_1 = createClickTimer(self.ui.dialog)
         timer_2 = createClickTimer(self.ui.dialog.stat_window)
         timer_1.start(10)
         timer_2.start(12)
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
         self.assertEqual("1", self.ui.dialog.total_words_value_label.text())
 
     def test_good_text_export_run(self):
@@ -572,11 +661,12 @@ class TestExportDialog(TestMainWindow):
         self.ui.text_radio.setChecked(True)
         self.ui.text_path.setText(TEST_TXT)
         self.ui.file_name = TEST_TXT
+        self.login()
         timer_1 = createClickTimer(self.ui.dialog)
         timer_2 = createClickTimer(self.ui.dialog.stat_window)
         timer_1.start(10)
         timer_2.start(12)
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
         self.assertEqual(str(total),
                          self.ui.dialog.total_words_value_label.text())
         self.assertEqual(str(prepared),
@@ -596,11 +686,12 @@ class TestExportDialog(TestMainWindow):
         self.ui.kindle_radio.setChecked(True)
         self.ui.kindle_path.setText(TEST_DB)
         self.ui.file_name = TEST_DB
+        self.login()
         timer_1 = createClickTimer(self.ui.dialog)
         timer_2 = createClickTimer(self.ui.dialog.stat_window)
         timer_1.start(10)
         timer_2.start(12)
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
         self.assertEqual(str(total),
                          self.ui.dialog.total_words_value_label.text())
         self.assertEqual(str(duplicates),
@@ -620,11 +711,12 @@ class TestExportDialog(TestMainWindow):
         self.ui.kindle_new_words_radio.setChecked(True)
         self.ui.kindle_path.setText(TEST_DB)
         self.ui.file_name = TEST_DB
+        self.login()
         timer_1 = createClickTimer(self.ui.dialog)
         timer_2 = createClickTimer(self.ui.dialog.stat_window)
         timer_1.start(10)
         timer_2.start(12)
-        leftMouseClick(self.ui.export_button)
+        self.clickExport()
         self.assertEqual(str(new),
                          self.ui.dialog.total_words_value_label.text())
         self.assertEqual(str(duplicates),
@@ -632,6 +724,33 @@ class TestExportDialog(TestMainWindow):
         self.assertEqual(str(new),
                          self.ui.dialog.prepared_words_value_label.text())
 
+    def test_clippings_not_done_without_export(self):
+        """
+        Export dialog closed before Start - highlights are
+        read again next time
+        """
+        state = Clippings.STATE_FILE
+        Clippings.STATE_FILE = TEST_STATE
+        with open(TEST_CLIPPINGS, 'w') as f:
+            f.write("Dune\n- Your Highlight on Location 10\n\n"
+                    "Sietch\n==========\n")
+        self.ui.text_radio.setChecked(True)
+        self.ui.text_path.setText(TEST_CLIPPINGS)
+        self.ui.file_name = TEST_CLIPPINGS
+        self.login()
+        timer_1 = createClickTimer(self.ui.dialog)
+        timer_2 = createClickTimer(self.ui.dialog.stat_window)
+        timer_1.start(10)
+        timer_2.start(12)
+        try:
+            self.clickExport()
+            self.assertEqual("1",
+                             self.ui.dialog.total_words_value_label.text())
+            self.assertFalse(os.path.exists(TEST_STATE))
+        finally:
+            Clippings.STATE_FILE = state
+            os.remove(TEST_CLIPPINGS)
+
 
 class TestStatisticsDialog(BaseTest, Results):
     """
@@ -6,13 +6,36 @@ Module for testing all modules, except gui_export
 -
 """
 import unittest
-from handler import Base, Kindle, Text, Input
+from handler import Base, Kindle, Text, Prose, Book, Clippings, Input,\
+                    dumpCopy, snapshot, MalformedError
 from service import Lingualeo
+from history import History
+from sync import Watcher, prepare, savedCredentials
+from words import Lemmatizer, Frequency, removeDuplicates
+from schedule import prioritize
+import secure
+from validate import validate, REASONS
+from outbox import Outbox, flush
+from writer import Writer, dump
+from anki import Deck
+from fanout import FanOut, Collector
+from dictionary import Translator, loadDictionaries
+from stats import Statistics
+from requests.exceptions import ConnectionError as NoConnection
 from collections import Counter
 from tests.test_gui import createSqlBase
 import sqlite3
+import requests
 import os
 import json
+import gzip
+import lzma
+import shutil
+import zipfile
+import csv
+import threading
+import struct
+import zlib
 
 def createTxtFile(txt_name):
     """
@@ -96,8 +119,33 @@ class TestLingualeo(unittest.TestCase):
         """
         self.lingualeo.TIMEOUT = 0.01
         self.lingualeo.initUser()
+        self.lingualeo.loadAvatar(cache_dir='test_avatars')
         self.assertEqual(self.lingualeo.avatar, None)
 
+    def test_avatar_cached(self):
+        """
+        Avatar is saved to cache and is the same when revalidated
+        """
+        cache_dir = 'test_avatars'
+        self.lingualeo.initUser()
+        avatar = self.lingualeo.loadAvatar(cache_dir=cache_dir)
+        cached = self.lingualeo.loadAvatar(cache_dir=cache_dir)
+        shutil.rmtree(cache_dir)
+        self.assertEqual(avatar, cached)
+
+    def test_session_reused(self):
+        """
+        Exported session is valid in new Lingualeo
+        and is not restored for another password
+        """
+        session = self.lingualeo.exportSession()
+        self.assertNotIn('meatballs', session)
+        lingualeo = Lingualeo(self.EMAIL, self.PASSWORD)
+        self.assertTrue(lingualeo.restoreSession(session))
+        self.assertTrue(lingualeo.isSessionValid())
+        other = Lingualeo(self.EMAIL, "wrong")
+        self.assertFalse(other.restoreSession(session))
+
 
 class TestKindleHandler(unittest.TestCase):
     """
@@ -148,6 +196,140 @@ class TestKindleHandler(unittest.TestCase):
         words_count = len(self.handler.data)
         self.assertEqual(words_count, self.all_words)
 
+    def test_lookups_grouped_by_stem(self):
+        """
+        Several lookups of one stem give one row with
+        count of lookups, first/last time and the last context
+        """
+        with sqlite3.connect(self.TEST_DB) as conn:
+            conn.execute("INSERT INTO LOOKUPS VALUES "
+                         "('TE2', 'en:test', '', '', '', 'Last test', 20)")
+            conn.execute("INSERT INTO LOOKUPS VALUES "
+                         "('TE3', 'en:test', '', '', '', 'Middle test', 10)")
+        self.handler.read()
+        self.assertEqual(len(self.handler.data), self.all_words)
+        self.assertEqual(self.handler.total, self.all_words)
+        self.assertEqual(self.handler.lookups, self.all_words + 2)
+        row = [i for i in self.handler.data if i['word'] == 'test'][0]
+        self.assertEqual(row['lookups'], 3)
+        self.assertEqual(row['first'], 0)
+        self.assertEqual(row['last'], 20)
+        self.assertEqual(row['context'], 'Last test')
+
+    def test_snapshot_in_cache(self):
+        """
+        Database is read from its snapshot in cache directory,
+        progress of copying is reported
+        """
+        cache_dir = 'test_cache'
+        steps = []
+        handler = Kindle(source=self.TEST_DB,
+                         cache_dir=cache_dir,
+                         progress=lambda *args: steps.append(args))
+        handler.read()
+        snapshots = os.listdir(cache_dir)
+        for i in snapshots:
+            os.remove(os.path.join(cache_dir, i))
+        os.rmdir(cache_dir)
+        self.assertEqual(len(handler.data), self.all_words)
+        self.assertEqual(len(snapshots), 1)
+        path, copied, total = steps[-1]
+        self.assertEqual((path, copied), (self.TEST_DB, total))
+
+    def test_dump_copy(self):
+        """
+        Copy without backup API (Python < 3.7) replaces old copy
+        """
+        target = 'test_copy.db'
+        original = sqlite3.connect(self.TEST_DB)
+        for _ in range(2):
+            conn = dumpCopy(original, target)
+            count = conn.execute("SELECT COUNT(*) FROM WORDS").fetchone()[0]
+            conn.close()
+        original.close()
+        os.remove(target)
+        self.assertEqual(count, self.all_words)
+
+    def test_malformed_snapshot(self):
+        """
+        Database broken after the first pages - its snapshot
+        doesn't pass integrity check
+        """
+        with sqlite3.connect(self.TEST_DB) as conn:
+            conn.executemany("INSERT INTO WORDS (id, word, stem, lang) "
+                             "VALUES (?, ?, ?, 'en')",
+                             (('en:w{}'.format(i), 'w', 'w')
+                              for i in range(3000)))
+        with open(self.TEST_DB, 'r+b') as f:
+            f.seek(4096 * 9)
+            f.write(b'\xff' * 4096)
+        with self.assertRaises(MalformedError) as error:
+            snapshot(self.TEST_DB)
+        self.assertEqual(error.exception.path, self.TEST_DB)
+
+    def test_truncate_only_given_words(self):
+        """
+        Truncate removes only given words and their lookups
+        """
+        self.handler.read()
+        ids = [i['ids'][self.TEST_DB][0] for i in self.handler.data
+               if i['word'] in ('tast', 'test')]
+        steps = []
+        Kindle.truncate(self.TEST_DB, ids, batch=1,
+                        progress=lambda *args: steps.append(args))
+        handler = Kindle(source=self.TEST_DB)
+        handler.read()
+        self.assertEqual(sorted(i['word'] for i in handler.data),
+                         ['tist', 'tost'])
+        self.assertEqual(handler.lookups, 2)
+        self.assertEqual(steps, [(1, 2), (2, 2)])
+
+    def test_mark_mastered(self):
+        """
+        Words marked as mastered are not new anymore
+        """
+        self.handler.read(only_new_words=True)
+        ids = [i['ids'][self.TEST_DB][0] for i in self.handler.data]
+        Kindle.markMastered(self.TEST_DB, ids[:1])
+        handler = Kindle(source=self.TEST_DB)
+        handler.read(only_new_words=True)
+        self.assertEqual(len(handler.data), self.new_words - 1)
+
+    def test_other_languages_kept_for_validation(self):
+        """
+        Words of other languages are read with their language,
+        the same stem of two languages gives two rows
+        """
+        with sqlite3.connect(self.TEST_DB) as conn:
+            conn.execute("INSERT INTO WORDS VALUES "
+                         "('de:test', 'test', 'test', 'de', 100, 0, '')")
+            conn.execute("INSERT INTO LOOKUPS VALUES "
+                         "('DE', 'de:test', '', '', '', 'Ein Test', 0)")
+        self.handler.read()
+        rows = [i for i in self.handler.data if i['word'] == 'test']
+        self.assertEqual(sorted(i['lang'] for i in rows), ['de', 'en'])
+        _, rejected = validate(self.handler.data)
+        self.assertEqual([i['context'] for i in rejected], ['Ein Test'])
+
+    def test_several_devices(self):
+        """
+        Words from several databases are merged without duplicates,
+        every word is tagged by its device
+        """
+        second_db = 'test_second.db'
+        if os.path.exists(second_db):
+            os.remove(second_db)
+        createSqlBase(db_name=second_db, array=['test', 'toast'], new=0)
+        handler = Kindle(source=[self.TEST_DB, second_db])
+        handler.read()
+        os.remove(second_db)
+        words = [i['word'] for i in handler.data]
+        self.assertEqual(sorted(words), sorted(self.array + ['toast']))
+        devices = Counter(i['device'] for i in handler.data)
+        self.assertEqual(devices[Kindle.device(self.TEST_DB)],
+                         self.all_words)
+        self.assertEqual(devices[Kindle.device(second_db)], 1)
+
 
 class TestTextHandler(unittest.TestCase):
     """
@@ -180,6 +362,243 @@ class TestTextHandler(unittest.TestCase):
         words_count = len(self.handler.data)
         self.assertEqual(words_count, self.words)
 
+    def test_compressed_text(self):
+        """
+        Gzipped txt file gives the same words as plain one
+        """
+        gz_name = self.TEST_TXT + '.gz'
+        with open(self.TEST_TXT, 'rb') as f, gzip.open(gz_name, 'wb') as g:
+            g.write(f.read())
+        handler = Text(source=gz_name)
+        handler.read()
+        os.remove(gz_name)
+        self.assertEqual([i['word'] for i in handler.data], self.array)
+
+
+class TestProseHandler(unittest.TestCase):
+    """
+    Ensure that Prose handler returns expected result
+    """
+    TEST_TXT = 'test.txt'
+    TEXT = ("He was watching the sea. The sea was calm!\n"
+            "Nobody was watching him.")
+
+    def setUp(self):
+        """
+        Create txt file with several sentences
+        """
+        with open(self.TEST_TXT, 'w') as f:
+            f.write(self.TEXT)
+        self.handler = Prose(source=self.TEST_TXT)
+
+    def tearDown(self):
+        """
+        Remove test.txt
+        """
+        if os.path.exists(self.TEST_TXT):
+            os.remove(self.TEST_TXT)
+
+    def test_unique_words_with_count_and_context(self):
+        """
+        Every word appears once with its count and first sentence
+        """
+        self.handler.read()
+        data = {i['word']: i for i in self.handler.data}
+        self.assertEqual(len(data), len(self.handler.data))
+        self.assertEqual(data['sea']['count'], 2)
+        self.assertEqual(data['watching']['count'], 2)
+        self.assertEqual(data['watching']['context'],
+                         "He was watching the sea.")
+        self.assertEqual(data['nobody']['context'],
+                         "Nobody was watching him.")
+
+    def test_chunks_end_on_sentences(self):
+        """
+        Small chunks give the same result as one chunk
+        """
+        self.handler.read()
+        expected = sorted((i['word'], i['count'])
+                          for i in self.handler.data)
+        handler = Prose(source=self.TEST_TXT)
+        handler.CHUNK_SIZE = 4
+        handler.read()
+        result = sorted((i['word'], i['count']) for i in handler.data)
+        self.assertEqual(result, expected)
+
+    def test_compressed_text(self):
+        """
+        Xz-compressed text gives the same result as plain one
+        """
+        self.handler.read()
+        expected = sorted((i['word'], i['count'], i['context'])
+                          for i in self.handler.data)
+        xz_name = self.TEST_TXT + '.xz'
+        with lzma.open(xz_name, 'wt') as f:
+            f.write(self.TEXT)
+        handler = Prose(source=xz_name)
+        handler.CHUNK_SIZE = 8
+        handler.read()
+        os.remove(xz_name)
+        result = sorted((i['word'], i['count'], i['context'])
+                        for i in handler.data)
+        self.assertEqual(result, expected)
+
+
+class TestBookHandler(unittest.TestCase):
+    """
+    Ensure that Book handler reads EPUB and HTML books
+    """
+    TEST_DIR = 'test_books'
+    CONTAINER = ('<container xmlns="urn:oasis:names:tc:opendocument:'
+                 'xmlns:container"><rootfiles>'
+                 '<rootfile full-path="OEBPS/content.opf"/>'
+                 '</rootfiles></container>')
+    PACKAGE = ('<package xmlns="http://www.idpf.org/2007/opf"><manifest>'
+               '<item id="two" href="two.xhtml"/>'
+               '<item id="one" href="one.xhtml"/>'
+               '</manifest><spine>'
+               '<itemref idref="one"/><itemref idref="two"/>'
+               '</spine></package>')
+
+    def setUp(self):
+        """
+        Folder with EPUB (two chapters) and HTML book
+        """
+        os.mkdir(self.TEST_DIR)
+        self.epub = os.path.join(self.TEST_DIR, 'book.epub')
+        with zipfile.ZipFile(self.epub, 'w') as book:
+            book.writestr('META-INF/container.xml', self.CONTAINER)
+            book.writestr('OEBPS/content.opf', self.PACKAGE)
+            book.writestr('OEBPS/one.xhtml',
+                          '<html><head><title>Title</title></head><body>'
+                          '<h1>Chapter</h1><p>The sea was calm.</p>'
+                          '</body></html>')
+            book.writestr('OEBPS/two.xhtml',
+                          '<html><body><p>The sea &amp; the sky.</p>'
+                          '<script>var x;</script></body></html>')
+        with open(os.path.join(self.TEST_DIR, 'article.html'), 'w') as f:
+            f.write('<p>Calm sky again.</p>')
+
+    def tearDown(self):
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_epub_in_reading_order(self):
+        """
+        Words of chapters, not of head/script, context - first sentence
+        """
+        handler = Book(self.epub)
+        handler.read()
+        data = {i['word']: i for i in handler.get()}
+        self.assertNotIn('title', data)
+        self.assertNotIn('var', data)
+        self.assertEqual(data['chapter']['context'], "Chapter")
+        self.assertEqual(data['sea']['context'], "The sea was calm.")
+        self.assertEqual(data['sea']['count'], 2)
+        self.assertEqual(data['sky']['context'], "The sea & the sky.")
+
+    def test_library_counts_merged(self):
+        """
+        Words of all books in folder are counted together
+        """
+        handler = Book(self.TEST_DIR)
+        handler.read()
+        data = {i['word']: i['count'] for i in handler.get()}
+        self.assertEqual(len(data), len(handler.get()))
+        self.assertEqual(data['calm'], 2)
+        self.assertEqual(data['sky'], 2)
+        self.assertEqual(data['again'], 1)
+
+
+class TestClippingsHandler(unittest.TestCase):
+    """
+    Ensure that Clippings handler reads only new short highlights
+    """
+    TEST_CLIPPINGS = 'My Clippings.txt'
+    TEST_STATE = 'test_clippings.json'
+    ENTRY = ("{0}\r\n- Your {1} on Location 10 | Added on Monday\r\n"
+             "\r\n{2}\r\n==========\r\n")
+
+    def setUp(self):
+        """
+        Clippings with highlights, long quote, note and bookmark
+        """
+        with open(self.TEST_CLIPPINGS, 'w', newline='') as f:
+            f.write('\ufeff')
+            f.write(self.ENTRY.format("Dune (Frank Herbert)",
+                                      "Highlight", "Sietch,"))
+            f.write(self.ENTRY.format("Dune (Frank Herbert)",
+                                      "Highlight",
+                                      "Fear is the mind-killer."))
+            f.write(self.ENTRY.format("Dune (Frank Herbert)",
+                                      "Note", "cool"))
+            f.write(self.ENTRY.format("Dune (Frank Herbert)",
+                                      "Bookmark", ""))
+            f.write(self.ENTRY.format("Emma (Jane Austen)",
+                                      "Highlight", "give up"))
+
+    def tearDown(self):
+        for i in (self.TEST_CLIPPINGS, self.TEST_STATE):
+            if os.path.exists(i):
+                os.remove(i)
+
+    def test_short_highlights_with_book(self):
+        """
+        Words and phrases of highlights, book - context
+        """
+        handler = Clippings(self.TEST_CLIPPINGS, self.TEST_STATE)
+        handler.read()
+        self.assertEqual(handler.get(),
+                         [{'word': 'sietch',
+                           'context': "Dune (Frank Herbert)"},
+                          {'word': 'give up',
+                           'context': "Emma (Jane Austen)"}])
+
+    def test_only_new_entries(self):
+        """
+        After done() only appended entries are read,
+        changed file is read from the beginning
+        """
+        handler = Clippings(self.TEST_CLIPPINGS, self.TEST_STATE)
+        handler.read()
+        handler.done()
+        with open(self.TEST_CLIPPINGS, 'a', newline='') as f:
+            f.write(self.ENTRY.format("Emma (Jane Austen)",
+                                      "Highlight", "amiable"))
+            # incomplete entry - Kindle is still writing
+            f.write("Emma (Jane Austen)\r\n")
+        handler = Clippings(self.TEST_CLIPPINGS, self.TEST_STATE)
+        handler.read()
+        self.assertEqual([i['word'] for i in handler.get()], ['amiable'])
+        with open(self.TEST_CLIPPINGS, 'r+b') as f:
+            f.write(b'X')
+        handler = Clippings(self.TEST_CLIPPINGS, self.TEST_STATE)
+        handler.read()
+        self.assertEqual(len(handler.get()), 3)
+
+
+class TestValidate(unittest.TestCase):
+    """
+    Ensure that words are validated before export
+    """
+
+    def test_reasons(self):
+        """
+        Valid words and phrases pass, the rest get reasons
+        """
+        array = [{'word': ' watch '},
+                 {'word': "give up"},
+                 {'word': ''},
+                 {'word': 'мир'},
+                 {'word': 'x'},
+                 {'word': 'a' * 100},
+                 {'word': 'Haus', 'lang': 'de'}]
+        valid, rejected = validate(array)
+        self.assertEqual([i['word'] for i in valid], ['watch', 'give up'])
+        self.assertEqual([i['reason'] for i in rejected],
+                         [REASONS['empty'], REASONS['chars'],
+                          REASONS['short'], REASONS['long'],
+                          REASONS['lang']])
+
 
 class TestInputHandler(unittest.TestCase):
     """
@@ -199,3 +618,665 @@ class TestInputHandler(unittest.TestCase):
         """
         self.handler.read()
         self.assertIn(self.handler.data, self.TEST_WORD)
+
+
+class TestHistory(unittest.TestCase):
+    """
+    Ensure that local history keeps one row per word
+    """
+    TEST_HISTORY = 'test_history.db'
+
+    def setUp(self):
+        """
+        Create history with two words
+        """
+        if os.path.exists(self.TEST_HISTORY):
+            os.remove(self.TEST_HISTORY)
+        self.history = History(self.TEST_HISTORY)
+        self.history.add([{'word': 'cat', 'tword': 'кот',
+                           'context': '', 'result': 'added'},
+                          {'word': 'dog', 'tword': '',
+                           'context': '', 'result': 'no translation'}],
+                         source='test')
+
+    def tearDown(self):
+        """
+        Remove test history
+        """
+        self.history.close()
+        if os.path.exists(self.TEST_HISTORY):
+            os.remove(self.TEST_HISTORY)
+
+    def test_known_words(self):
+        """
+        Only words with given results are known
+        """
+        self.assertEqual(self.history.known(['added', 'exists']), {'cat'})
+
+    def test_word_is_unique(self):
+        """
+        Word exported again replaces the old row
+        """
+        self.history.add([{'word': 'dog', 'tword': 'собака',
+                           'context': '', 'result': 'added'}])
+        self.assertEqual(self.history.known(['added']), {'cat', 'dog'})
+        count = self.history.conn.execute(
+            "SELECT COUNT(*) FROM HISTORY").fetchone()[0]
+        self.assertEqual(count, 2)
+
+    def test_translations(self):
+        """
+        Only words with translation are in cache
+        """
+        self.assertEqual(self.history.translations(), {'cat': 'кот'})
+
+
+class TestWatcher(unittest.TestCase):
+    """
+    Ensure that Watcher finds mounted Kindle and its changes
+    """
+    TEST_ROOT = 'test_media'
+    TEST_STATE = 'test_sync.json'
+
+    def setUp(self):
+        """
+        Create Kindle folder with database
+        """
+        self.tearDown()
+        self.path = os.path.join(self.TEST_ROOT, 'Kindle', Kindle.VOCAB_PATH)
+        os.makedirs(os.path.dirname(self.path))
+        createSqlBase(db_name=self.path, array=['test'], new=1)
+        self.watcher = Watcher(roots=[self.TEST_ROOT],
+                               state_file=self.TEST_STATE)
+
+    def tearDown(self):
+        """
+        Remove Kindle folder and state
+        """
+        if os.path.exists(self.TEST_ROOT):
+            shutil.rmtree(self.TEST_ROOT)
+        if os.path.exists(self.TEST_STATE):
+            os.remove(self.TEST_STATE)
+
+    def test_new_kindle_is_changed(self):
+        """
+        Mounted Kindle is changed until it's exported
+        """
+        changed = self.watcher.changed()
+        self.assertEqual(list(changed), [self.path])
+        self.watcher.done(changed)
+        self.assertEqual(self.watcher.changed(), {})
+        # state is saved between launches
+        watcher = Watcher(roots=[self.TEST_ROOT], state_file=self.TEST_STATE)
+        self.assertEqual(watcher.changed(), {})
+
+    def test_changed_database(self):
+        """
+        New lookup in database - database is changed
+        """
+        self.watcher.done(self.watcher.changed())
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("INSERT INTO LOOKUPS VALUES "
+                         "('NEW', 'en:test', '', '', '', 'New test', 1)")
+        self.assertEqual(list(self.watcher.changed()), [self.path])
+
+
+class TestSync(unittest.TestCase):
+    """
+    Ensure that sync prepares words as GUI does
+    and reads saved credentials
+    """
+    TEST_SRC = 'test_sync.ini'
+
+    def tearDown(self):
+        if os.path.exists(self.TEST_SRC):
+            os.remove(self.TEST_SRC)
+
+    def test_words_prepared(self):
+        """
+        Forms of one word give one row, not valid words are dropped
+        """
+        rows = [{'word': 'watched', 'context': 'a'},
+                {'word': 'watches', 'context': 'b'},
+                {'word': '123', 'context': ''}]
+        prepared = prepare(rows, Lemmatizer())
+        self.assertEqual([(i['word'], i['context']) for i in prepared],
+                         [('watch', 'a')])
+
+    def test_saved_credentials(self):
+        """
+        Email/password of GUI settings, empty if there are none
+        """
+        self.assertEqual(savedCredentials(self.TEST_SRC), ("", ""))
+        with open(self.TEST_SRC, 'w') as f:
+            f.write("[General]\nemail=b@b.com\npassword=\"1,2\"\n")
+        self.assertEqual(savedCredentials(self.TEST_SRC),
+                         ("b@b.com", "1,2"))
+
+
+class TestLemmatizer(unittest.TestCase):
+    """
+    Ensure that inflected forms are normalized
+    """
+
+    def setUp(self):
+        """
+        Load bundled table
+        """
+        self.lemmatizer = Lemmatizer()
+
+    def test_inflected_forms(self):
+        """
+        Forms of verbs and nouns give their lemmas
+        """
+        for word in ('watched', 'Watching', 'watches', 'watch'):
+            self.assertEqual(self.lemmatizer.lemma(word), 'watch')
+        self.assertEqual(self.lemmatizer.lemma('knives'), 'knife')
+        self.assertEqual(self.lemmatizer.lemma('was'), 'be')
+
+    def test_unknown_and_base_words(self):
+        """
+        Unknown words and words which are lemmas themselves
+        are not changed
+        """
+        self.assertEqual(self.lemmatizer.lemma('zecrvt'), 'zecrvt')
+        self.assertEqual(self.lemmatizer.lemma('building'), 'building')
+
+    def test_ambiguous_forms(self):
+        """
+        Forms which are words themselves are not mapped
+        """
+        for word in ('left', 'lives', 'leaves', 'wills', 'bes', 'haves'):
+            self.assertEqual(self.lemmatizer.lemma(word), word)
+
+    def test_normalize_array(self):
+        """
+        Every word of array is replaced by lemma
+        """
+        array = [{'word': 'guests', 'context': ''}, {'word': 'doing'}]
+        self.lemmatizer.normalize(array)
+        self.assertEqual([i['word'] for i in array], ['guest', 'do'])
+
+    def test_merged_kindle_rows(self):
+        """
+        Kindle rows of one lemma - ids and lookups are merged
+        """
+        array = [{'word': 'watched', 'lookups': 1, 'first': 5, 'last': 5,
+                  'ids': {'a.db': [1]}},
+                 {'word': 'watches', 'lookups': 2, 'first': 3, 'last': 9,
+                  'ids': {'a.db': [2], 'b.db': [7]}}]
+        rows = removeDuplicates(self.lemmatizer.normalize(array))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['ids'], {'a.db': [1, 2], 'b.db': [7]})
+        self.assertEqual((rows[0]['lookups'], rows[0]['first'],
+                          rows[0]['last']), (3, 3, 9))
+
+
+class TestFrequency(unittest.TestCase):
+    """
+    Ensure that common words are found by bundled list
+    """
+
+    def setUp(self):
+        """
+        Load bundled list
+        """
+        self.frequency = Frequency()
+
+    def test_ranks(self):
+        """
+        Common words have small ranks, forms - rank of lemma,
+        rare words - None
+        """
+        self.assertEqual(self.frequency.rank('the'), 1)
+        self.assertEqual(self.frequency.rank('Watched'),
+                         self.frequency.rank('watch'))
+        self.assertIsNone(self.frequency.rank('serendipity'))
+        self.assertIsNone(self.frequency.rank('haves'))
+
+    def test_split(self):
+        """
+        Words with rank up to max_rank are common, order is kept
+        """
+        array = [{'word': i} for i in ('house', 'zecrvt', 'the', 'ocean')]
+        rare, common = self.frequency.split(
+            array, self.frequency.rank('house'))
+        self.assertEqual([i['word'] for i in rare], ['zecrvt', 'ocean'])
+        self.assertEqual([i['word'] for i in common], ['house', 'the'])
+
+
+class TestPrioritize(unittest.TestCase):
+    """
+    Ensure that valuable words go first when budget is limited
+    """
+    NOW = 1000000000
+
+    def setUp(self):
+        """
+        Words with different lookups and times (ms)
+        """
+        now = self.NOW * 1000
+        self.array = [{'word': 'old', 'lookups': 3, 'last': now - 10 ** 11},
+                      {'word': 'once', 'lookups': 1, 'last': now},
+                      {'word': 'often', 'lookups': 3, 'last': now},
+                      {'word': 'twice', 'lookups': 2, 'last': now}]
+
+    def test_top_words_first(self):
+        """
+        Budget of two - two best words first, the rest by value too
+        """
+        result = prioritize(self.array, 2, now=self.NOW)
+        self.assertEqual([i['word'] for i in result],
+                         ['often', 'twice', 'once', 'old'])
+
+    def test_equal_words_keep_order(self):
+        """
+        Words without lookups keep their order
+        """
+        array = [{'word': i} for i in ('a', 'b', 'c')]
+        result = prioritize(array, 2)
+        self.assertEqual([i['word'] for i in result], ['a', 'b', 'c'])
+
+
+class FakeKeyring(object):
+    """
+    Keyring in memory, fails if 'broken'
+    """
+
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.passwords = {}
+
+    def set_password(self, service, name, secret):
+        if self.broken:
+            raise RuntimeError("No recommended backend")
+        self.passwords[(service, name)] = secret
+
+    def get_password(self, service, name):
+        if self.broken:
+            raise RuntimeError("No recommended backend")
+        return self.passwords.get((service, name))
+
+
+class TestSecure(unittest.TestCase):
+    """
+    Ensure that secrets are kept in keyring
+    """
+
+    def setUp(self):
+        self.keyring = secure.keyring
+
+    def tearDown(self):
+        secure.keyring = self.keyring
+
+    def test_saved_secret_loaded(self):
+        secure.keyring = FakeKeyring()
+        self.assertTrue(secure.save("user", "session"))
+        self.assertEqual(secure.load("user"), "session")
+        self.assertIsNone(secure.load("other"))
+
+    def test_no_keyring(self):
+        """
+        Nothing is saved without keyring, no errors
+        """
+        for keyring in (None, FakeKeyring(broken=True)):
+            secure.keyring = keyring
+            self.assertFalse(secure.save("user", "session"))
+            self.assertIsNone(secure.load("user"))
+
+    def test_session_by_email(self):
+        """
+        Session is saved under email, password is checked
+        by salted hash inside the secret
+        """
+        secure.keyring = FakeKeyring()
+        lingualeo = Lingualeo("b@b.com", "1234")
+        lingualeo.cookies = requests.cookies.RequestsCookieJar()
+        secure.save(lingualeo.user(), lingualeo.exportSession())
+        self.assertEqual(list(secure.keyring.passwords),
+                         [(secure.SERVICE, "b@b.com")])
+        session = secure.load("b@b.com")
+        self.assertNotIn("1234", session)
+        self.assertTrue(Lingualeo("b@b.com", "1234").restoreSession(session))
+        self.assertFalse(Lingualeo("b@b.com", "123").restoreSession(session))
+
+
+class OfflineLingualeo(object):
+    """
+    Lingualeo which loses connection after 'online' words
+    """
+    premium = 0
+
+    def __init__(self, online, meatballs=100):
+        self.online = online
+        self.meatballs = meatballs
+
+    def get_translate(self, word):
+        if word not in self.online:
+            raise NoConnection()
+        return {"is_exist": True, "word": word, "tword": word}
+
+
+class TestOutbox(unittest.TestCase):
+    """
+    Ensure that queued words are kept until exported
+    """
+    TEST_OUTBOX = 'test_outbox.db'
+
+    def setUp(self):
+        """
+        Outbox with three words, one of them twice
+        """
+        self.outbox = Outbox(self.TEST_OUTBOX)
+        self.outbox.put([{'word': 'Cat', 'context': 'A cat.'},
+                         {'word': 'dog'},
+                         {'word': 'cat'},
+                         {'word': 'bird'}], "input")
+
+    def tearDown(self):
+        self.outbox.close()
+        os.remove(self.TEST_OUTBOX)
+
+    def test_words_queued_once_in_order(self):
+        """
+        The same word is queued once, first queued - first
+        """
+        rows = self.outbox.peek(10)
+        self.assertEqual([i['word'] for i in rows], ['cat', 'dog', 'bird'])
+        self.assertEqual(rows[0]['context'], 'A cat.')
+        self.assertEqual(len(self.outbox), 3)
+
+    def test_flush_keeps_not_exported(self):
+        """
+        Connection is lost - not exported words stay in outbox
+        """
+        lingualeo = OfflineLingualeo(online={'cat', 'dog'})
+        rows = flush(self.outbox, lingualeo, batch=2, workers=2)
+        self.assertEqual([i['word'] for i in rows], ['cat', 'dog'])
+        self.assertEqual([i['word'] for i in self.outbox.peek(10)],
+                         ['bird'])
+
+
+class TestWriter(unittest.TestCase):
+    """
+    Ensure that rows are written in chosen format
+    """
+    TEST_CSV = 'test_writer.csv'
+    TEST_JSONL = 'test_writer.jsonl'
+    ROWS = [{'word': 'cat', 'tword': 'кот', 'context': 'A cat, a dog.',
+             'result': 'added', 'duration': 0.25},
+            {'word': 'dog', 'result': 'exists'}]
+
+    def tearDown(self):
+        for i in (self.TEST_CSV, self.TEST_JSONL):
+            if os.path.exists(i):
+                os.remove(i)
+
+    def test_csv(self):
+        """
+        Header and rows, missing fields are empty
+        """
+        with Writer(self.TEST_CSV, chunk=1) as writer:
+            writer.writeMany(self.ROWS)
+        self.assertEqual(writer.count, 2)
+        with open(self.TEST_CSV, encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(rows[0]['context'], 'A cat, a dog.')
+        self.assertEqual(rows[0]['tword'], 'кот')
+        self.assertEqual(rows[1]['duration'], '')
+
+    def test_jsonl(self):
+        """
+        One JSON object per line
+        """
+        with Writer(self.TEST_JSONL) as writer:
+            writer.writeMany(self.ROWS)
+        with open(self.TEST_JSONL, encoding='utf-8') as f:
+            rows = [json.loads(i) for i in f]
+        self.assertEqual(rows[0]['duration'], 0.25)
+        self.assertEqual(rows[1]['word'], 'dog')
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            Writer('test_writer.txt')
+
+    def test_dump_word_list(self):
+        """
+        Word list has only word and context, every word once
+        (after removeDuplicates)
+        """
+        rows = [{'word': 'cat', 'context': 'A cat.', 'count': 2},
+                {'word': 'cat'},
+                {'word': 'dog'}]
+        rows = removeDuplicates(rows)
+        self.assertEqual(dump(iter(rows), self.TEST_CSV), 2)
+        with open(self.TEST_CSV, encoding='utf-8') as f:
+            self.assertEqual(f.readline().strip(), 'word,context')
+
+
+class TestAnki(unittest.TestCase):
+    """
+    Ensure that Anki package has one note per word
+    """
+    TEST_APKG = 'test_deck.apkg'
+
+    def tearDown(self):
+        if os.path.exists(self.TEST_APKG):
+            os.remove(self.TEST_APKG)
+
+    def test_notes_and_cards(self):
+        """
+        Duplicates are skipped, translation is taken from cache
+        """
+        rows = [{'word': 'cat', 'context': 'A <b>cat</b>.'},
+                {'word': 'Cat'},
+                {'word': 'dog', 'tword': 'собака'}]
+        deck = Deck(self.TEST_APKG, translations={'cat': 'кот'})
+        self.assertEqual(deck.write(rows), 2)
+        with zipfile.ZipFile(self.TEST_APKG) as package:
+            self.assertEqual(package.read('media'), b'{}')
+            package.extract(Deck.COLLECTION)
+        conn = sqlite3.connect(Deck.COLLECTION)
+        notes = [i.split('\x1f') for i, in conn.execute(
+            "SELECT flds FROM notes ORDER BY id")]
+        cards = conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+        conn.close()
+        os.remove(Deck.COLLECTION)
+        self.assertEqual(notes,
+                         [['cat', 'кот', 'A &lt;b&gt;cat&lt;/b&gt;.'],
+                          ['dog', 'собака', '']])
+        self.assertEqual(cards, 2)
+
+    def test_translated_only(self):
+        """
+        Rows without translation are skipped if asked
+        """
+        rows = [{'word': 'cat'}, {'word': 'dog'}, {'word': 'Dog'}]
+        deck = Deck(self.TEST_APKG, translations={'dog': 'собака'},
+                    translated_only=True)
+        self.assertEqual(deck.notes(rows), [('dog', 'собака', '')])
+
+
+class ListSink(object):
+    """
+    Sink which keeps rows, waits for 'event' before
+    every row if it is given
+    """
+
+    def __init__(self, event=None):
+        self.event = event
+        self.rows = []
+        self.closed = False
+
+    def write(self, row):
+        if self.event:
+            self.event.wait()
+        self.rows.append(row)
+
+    def close(self):
+        self.closed = True
+
+
+class BrokenSink(ListSink):
+
+    def write(self, row):
+        raise OSError("disk is full")
+
+
+class TestFanOut(unittest.TestCase):
+    """
+    Ensure that every sink gets all rows
+    """
+    ROWS = [{'word': 'cat', 'result': 'added'},
+            {'word': 'dog', 'result': 'rejected'},
+            {'word': 'bird', 'result': 'exists'}]
+
+    def test_slow_sink_does_not_hold_others(self):
+        """
+        Fast sink gets rows while slow sink waits,
+        slow sink gets them all at the end
+        """
+        event = threading.Event()
+        slow, fast = ListSink(event), ListSink()
+        fanout = FanOut([slow, fast], size=len(self.ROWS))
+        fanout.putMany(self.ROWS)
+        while len(fast.rows) < len(self.ROWS):
+            pass
+        self.assertEqual(slow.rows, [])
+        event.set()
+        self.assertEqual(fanout.close(), {})
+        self.assertEqual(slow.rows, self.ROWS)
+        self.assertTrue(slow.closed and fast.closed)
+
+    def test_broken_sink(self):
+        """
+        Error of one sink is returned, the rest are written
+        """
+        broken, good = BrokenSink(), ListSink()
+        fanout = FanOut([broken, good], size=1)
+        fanout.putMany(self.ROWS)
+        errors = fanout.close()
+        self.assertIsInstance(errors[broken], OSError)
+        self.assertEqual(good.rows, self.ROWS)
+
+    def test_collector(self):
+        """
+        Collector passes only rows with given results
+        """
+        collected = []
+        fanout = FanOut([Collector(collected.extend, ['added', 'exists'])])
+        fanout.putMany(self.ROWS)
+        fanout.close()
+        self.assertEqual([i['word'] for i in collected], ['cat', 'bird'])
+
+
+def createStarDict(base, definitions, dictzip=False, chunk=16):
+    """
+    StarDict dictionary base.ifo, base.idx and base.dict
+    (base.dict.dz with chunks of 'chunk' bytes)
+    """
+    data, index = b'', b''
+    # StarDict order - ASCII lowercase, then exact
+    for word in sorted(definitions, key=lambda i: (i.lower(), i)):
+        text = definitions[word].encode('utf-8')
+        index += word.encode('utf-8') + b'\0' + \
+            struct.pack('>LL', len(data), len(text))
+        data += text
+    with open(base + '.ifo', 'w') as f:
+        f.write("StarDict's dict ifo file\nversion=2.4.2\n"
+                "wordcount={}\nbookname=Test\n"
+                "sametypesequence=m\n".format(len(definitions)))
+    with open(base + '.idx', 'wb') as f:
+        f.write(index)
+    if not dictzip:
+        with open(base + '.dict', 'wb') as f:
+            f.write(data)
+        return
+    chunks = []
+    for i in range(0, len(data), chunk):
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+        chunks.append(compressor.compress(data[i:i + chunk]) +
+                      compressor.flush(zlib.Z_FULL_FLUSH))
+    ra = struct.pack('<HHH', 1, chunk, len(chunks)) + \
+        b''.join(struct.pack('<H', len(i)) for i in chunks)
+    extra = b'RA' + struct.pack('<H', len(ra)) + ra
+    with open(base + '.dict.dz', 'wb') as f:
+        f.write(b'\x1f\x8b\x08\x04' + b'\0' * 6 +
+                struct.pack('<H', len(extra)) + extra)
+        f.write(b''.join(chunks) + b'\x03\x00' + b'\0' * 8)
+
+
+class TestStarDict(unittest.TestCase):
+    """
+    Ensure that words are translated by local dictionary
+    """
+    TEST_DIR = 'test_dicts'
+    DEFINITIONS = {'cat': "[kæt]\n1. кот, кошка\n2. хлыст",
+                   'Apple': "<b>яблоко</b>",
+                   'apple': "яблоня; яблоко",
+                   'zebra': "зебра",
+                   'dog': "собака"}
+
+    def setUp(self):
+        os.mkdir(self.TEST_DIR)
+        createStarDict(os.path.join(self.TEST_DIR, 'plain'),
+                       self.DEFINITIONS)
+        createStarDict(os.path.join(self.TEST_DIR, 'zipped'),
+                       self.DEFINITIONS, dictzip=True)
+        self.dictionaries = loadDictionaries(self.TEST_DIR)
+
+    def tearDown(self):
+        for i in self.dictionaries:
+            i.close()
+        shutil.rmtree(self.TEST_DIR)
+
+    def test_lookup(self):
+        """
+        Exact case is preferred, the first meaning is taken
+        """
+        self.assertEqual(len(self.dictionaries), 2)
+        for i in self.dictionaries:
+            self.assertEqual(len(i), len(self.DEFINITIONS))
+            self.assertEqual(i.get_translate('cat')['tword'], 'кот')
+            self.assertEqual(i.get_translate('apple')['tword'], 'яблоня')
+            self.assertEqual(i.get_translate('Apple')['tword'], 'яблоко')
+            self.assertEqual(i.get_translate('ZEBRA')['tword'], 'зебра')
+            self.assertEqual(i.get_translate('cow')['tword'], '')
+
+    def test_lingualeo_only_for_missing_words(self):
+        """
+        Lingualeo is asked only if local dictionary has no word
+        """
+        lingualeo = OfflineLingualeo(online={'cow'})
+        translator = Translator(self.dictionaries[:1] + [lingualeo])
+        self.assertTrue(translator.get_translate('dog')['local'])
+        response = translator.get_translate('cow')
+        self.assertFalse(response['local'])
+        self.assertEqual(response['tword'], 'cow')
+        with self.assertRaises(NoConnection):
+            translator.get_translate('bird')
+
+
+class TestStatistics(unittest.TestCase):
+    """
+    Ensure that statistics are counted while rows come
+    """
+
+    def test_counts_and_order(self):
+        """
+        Rows are grouped by result, the tail is added as range
+        """
+        array = [{'word': i, 'context': ''} for i in
+                 ('cat', 'dog', 'bird', 'fox', 'owl')]
+        stat = Statistics([{'word': 'cat', 'result': 'exists'},
+                           {'word': 'dog', 'result': 'added'}])
+        stat.add({'word': 'bird', 'result': 'exists'})
+        stat.addRange('not added', array, 3)
+        self.assertEqual(len(stat), 5)
+        self.assertEqual(stat.count('exists'), 2)
+        self.assertEqual(stat.count('not added'), 2)
+        self.assertEqual(stat.count('queued'), 0)
+        self.assertEqual([i['word'] for i in stat],
+                         ['dog', 'cat', 'bird', 'fox', 'owl'])
+        self.assertEqual([i['word'] for i in stat.rows(['not added'])],
+                         ['fox', 'owl'])
@@ -0,0 +1,62 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+===Description===
+Module for validation of words before export.
+Words of every source are checked at once, before any
+network work - rejected words get a reason and go
+straight to statistics.
+"""
+
+import re
+
+# English letters, apostrophes and hyphens, words of phrase
+# are separated by spaces. The same pattern is used by
+# validator of manual input (QRegExp).
+WORD_PATTERN = r"[a-zA-Z`'-]+(?:\s+[a-zA-Z`'-]+)*"
+ALLOWED = re.compile("^{}$".format(WORD_PATTERN))
+MIN_LENGTH = 2
+MAX_LENGTH = 64
+# language of Kindle words
+LANGUAGE = 'en'
+
+REASONS = {'empty': "empty",
+           'lang': "not English word",
+           'chars': "not English letters",
+           'short': "too short",
+           'long': "too long"}
+
+
+def reason(row):
+    """
+    Why word can't be exported or None for valid word
+    """
+    word = row['word']
+    if not word:
+        return REASONS['empty']
+    if row.get('lang', LANGUAGE) != LANGUAGE:
+        return REASONS['lang']
+    if not ALLOWED.match(word):
+        return REASONS['chars']
+    if len(word) < MIN_LENGTH:
+        return REASONS['short']
+    if len(word) > MAX_LENGTH:
+        return REASONS['long']
+    return None
+
+
+def validate(array):
+    """
+    Split array into valid rows and rejected rows.
+    Words are stripped, rejected rows get 'reason'.
+    """
+    valid, rejected = [], []
+    for row in array:
+        row['word'] = (row.get('word') or '').strip()
+        why = reason(row)
+        if why:
+            row['reason'] = why
+            rejected.append(row)
+        else:
+            valid.append(row)
+    return valid, rejected
@@ -0,0 +1,146 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+===Description===
+Module for normalizing words before export.
+Word lists are bundled as sorted text files (key<TAB>value),
+memory-mapped and searched by bisection - nothing is loaded
+into memory.
+
+Lemmatizer - inflected form to lemma (watched - watch).
+Frequency - rank of word among the most frequent English words.
+removeDuplicates - one row per word after normalizing.
+"""
+
+import os
+import mmap
+
+
+class SortedIndex(object):
+    """
+    Memory-mapped file of lines key<TAB>value sorted by key (bytes).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get(self, key, default=None):
+        """
+        Value of key or default.
+        Bisection over byte offsets - every step is aligned
+        to the start of line.
+        """
+        key = key.encode('utf-8')
+        m = self.map
+        low, high = 0, len(m)
+        while low < high:
+            middle = (low + high) // 2
+            start = m.rfind(b'\n', 0, middle) + 1
+            end = m.find(b'\n', start)
+            if end == -1:
+                end = len(m)
+            line_key, _, value = m[start:end].partition(b'\t')
+            if line_key == key:
+                return value.decode('utf-8')
+            if line_key < key:
+                low = end + 1
+            else:
+                high = start
+        return default
+
+    def close(self):
+        self.map.close()
+
+
+class Lemmatizer(object):
+    """
+    Normalizes words to their lemmas by bundled table.
+    Unknown words are left as they are.
+    """
+    LEMMAS_FILE = os.path.join("src", "data", "lemmas.txt")
+
+    def __init__(self, path=None):
+        self.index = SortedIndex(path or self.LEMMAS_FILE)
+
+    def lemma(self, word):
+        """
+        Lemma of word (lowercased)
+        """
+        word = word.lower()
+        return self.index.get(word, word)
+
+    def normalize(self, array):
+        """
+        Replace every word of array by its lemma.
+        Array - list of dictionaries {"word": word, ...}
+        """
+        for row in array:
+            row['word'] = self.lemma(row['word'])
+        return array
+
+
+class Frequency(object):
+    """
+    Ranks of the most frequent English words by bundled list
+    (1 - the most frequent). Inflected forms have the rank
+    of their lemma. The list is built from wordfreq data,
+    see src/data/README.md.
+    """
+    FREQUENCY_FILE = os.path.join("src", "data", "frequency.txt")
+
+    def __init__(self, path=None):
+        self.index = SortedIndex(path or self.FREQUENCY_FILE)
+
+    def rank(self, word):
+        """
+        Rank of word or None for rare (not listed) word
+        """
+        rank = self.index.get(word.lower())
+        return int(rank) if rank else None
+
+    def split(self, array, max_rank):
+        """
+        Split array into rare words and common words
+        (rank is max_rank or less). Order is kept.
+        """
+        rare, common = [], []
+        for row in array:
+            rank = self.rank(row['word'])
+            if rank is not None and rank <= max_rank:
+                common.append(row)
+            else:
+                rare.append(row)
+        return rare, common
+
+
+def removeDuplicates(array):
+    """
+    Rows of array without repeated words (the first row
+    of word is kept). The same word can appear with
+    different context or become the same after normalize.
+    Kindle rows of removed words are merged into the kept
+    one - their ids and lookups are not lost.
+    """
+    result = []
+    kept = {}
+    for row in array:
+        first = kept.get(row['word'])
+        if first is None:
+            kept[row['word']] = row
+            result.append(row)
+            continue
+        if 'ids' in row:
+            ids = first.setdefault('ids', {})
+            for path, word_ids in row['ids'].items():
+                ids[path] = ids.get(path, []) + word_ids
+        if 'lookups' in row:
+            first['lookups'] = first.get('lookups', 0) + row['lookups']
+        if 'first' in row:
+            first['first'] = min(first.get('first', row['first']),
+                                 row['first'])
+        if 'last' in row:
+            first['last'] = max(first.get('last', row['last']),
+                                row['last'])
+    return result
@@ -0,0 +1,106 @@
+# !/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+===Description===
+Module for saving words and results of export to files.
+Writer writes rows while they come and flushes them in chunks,
+only one chunk is kept in memory.
+Format is chosen by extension - .csv, .tsv or .jsonl (JSON Lines).
+"""
+
+import os
+import csv
+import json
+
+# rows of export
+FIELDS = ("word", "tword", "context", "result", "duration")
+# word list
+WORD_FIELDS = ("word", "context")
+FORMATS = ('.csv', '.tsv', '.jsonl')
+
+
+class Writer(object):
+    """
+    Streaming writer of rows (dictionaries) - only given fields,
+    missing ones are empty.
+    """
+    CHUNK = 1000
+
+    def __init__(self, path, fields=FIELDS, chunk=None):
+        """
+        Open file and write header (CSV, TSV)
+        """
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in FORMATS:
+            raise ValueError("Unknown format - {}".format(ext))
+        self.path = path
+        self.fields = fields
+        self.chunk = chunk or self.CHUNK
+        self.buffer = []
+        self.count = 0
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.csv = None
+        if ext != '.jsonl':
+            self.csv = csv.DictWriter(self.file,
+                                      fieldnames=fields,
+                                      restval='',
+                                      extrasaction='ignore',
+                                      delimiter=',' if ext == '.csv' else '\t')
+            self.csv.writeheader()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, row):
+        """
+        Add row, write chunk if it is full
+        """
+        self.buffer.append(row)
+        if len(self.buffer) >= self.chunk:
+            self.flush()
+
+    def writeMany(self, rows):
+        """
+        Add rows one by one
+        """
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        """
+        Write buffered rows to disk
+        """
+        if self.csv:
+            self.csv.writerows(self.buffer)
+        else:
+            self.file.writelines(
+                json.dumps({i: row.get(i, '') for i in self.fields},
+                           ensure_ascii=False) + '\n'
+                for row in self.buffer)
+        self.file.flush()
+        self.count += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        """
+        Write the rest and close file
+        """
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+
+def dump(rows, path, fields=WORD_FIELDS):
+    """
+    Write word list. Rows may be any iterable, nothing is kept -
+    duplicates are removed by caller (see words.removeDuplicates).
+    Return count of written words.
+    """
+    with Writer(path, fields) as writer:
+        for row in rows:
+            writer.write(row)
+    return writer.count